@@ -17,8 +17,9 @@ sys.path.insert(0, __base__)
 
 #################################################################################################
 
-from entrypoint import Events  # noqa: F402
-from helper import LazyLogger  # noqa: F402
+from entrypoint import Events  # noqa: E402
+from helper import LazyLogger  # noqa: E402
+from entrypoint import flush_on_exit  # noqa: E402
 
 #################################################################################################
 
@@ -29,11 +30,12 @@ LOG = LazyLogger(__name__)
 
 if __name__ == "__main__":
 
-    LOG.debug("--->[ default ]")
+    with flush_on_exit():
+        LOG.debug("--->[ default ]")
 
-    try:
-        Events()
-    except Exception as error:
-        LOG.exception(error)
+        try:
+            Events()
+        except Exception as error:
+            LOG.exception(error)
 
-    LOG.info("---<[ default ]")
+        LOG.info("---<[ default ]")
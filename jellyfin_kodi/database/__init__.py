@@ -2,17 +2,20 @@
 from __future__ import division, absolute_import, print_function, unicode_literals
 #################################################################################################
 
+import copy
 import datetime
 import logging
 import json
 import os
 import sqlite3
+import threading
+import time
 
 from kodi_six import xbmc, xbmcvfs
 from six import text_type
 
-from database import jellyfin_db
-from helper import translate, settings, window, dialog
+from database import jellyfin_db, migrations
+from helper import translate, settings, window, dialog, STOP
 from objects import obj
 from helper import LazyLogger
 
@@ -21,6 +24,8 @@ from helper import LazyLogger
 LOG = LazyLogger(__name__)
 
 ADDON_DATA = xbmc.translatePath("special://profile/addon_data/plugin.video.jellyfin/")
+POOL = threading.local()
+SYNCHRONOUS = ["OFF", "NORMAL", "FULL"]
 
 #################################################################################################
 
@@ -33,8 +38,10 @@ class Database(object):
             db.conn.commit()
     '''
     timeout = 120
+    cached_statements = 256
     discovered = False
     discovered_file = None
+    pooled = False
 
     def __init__(self, file=None, commit_close=True):
 
@@ -47,14 +54,27 @@ class Database(object):
 
         ''' Open the connection and return the Database class.
             This is to allow for the cursor, conn and others to be accessible.
+
+            Connections to the jellyfin and kodi databases are kept per thread and reused
+            by the next context of that thread. A nested context for the same database
+            gets its own connection, as before.
         '''
-        self.path = self._sql(self.db_file)
-        self.conn = sqlite3.connect(self.path, timeout=self.timeout)
-        self.cursor = self.conn.cursor()
+        pool = POOL.__dict__.setdefault('connections', {})
+        busy = POOL.__dict__.setdefault('busy', set())
 
-        if self.db_file in ('video', 'music', 'texture', 'jellyfin'):
-            self.conn.execute("PRAGMA journal_mode=WAL")  # to avoid writing conflict with kodi
+        if self.db_file in ('video', 'music', 'texture', 'jellyfin') and self.db_file not in busy and settings('dbPooling.bool'):
 
+            if self.db_file not in pool:
+                pool[self.db_file] = self._connect()
+
+            self.pooled = True
+            self.conn = pool[self.db_file]
+            busy.add(self.db_file)
+        else:
+            self.conn = self._connect()
+
+        self.cursor = self.conn.cursor()
+        self.changes = self.conn.total_changes
         LOG.debug("--->[ database: %s ] %s", self.db_file, id(self.conn))
 
         if not window('jellyfin_db_check.bool') and self.db_file == 'jellyfin':
@@ -63,17 +83,37 @@ class Database(object):
             jellyfin_tables(self.cursor)
             self.conn.commit()
 
-        # Migration for #162
-        if self.db_file == 'music':
-            query = self.conn.execute('SELECT * FROM path WHERE strPath LIKE "%/emby/%"')
-            contents = query.fetchall()
-            if contents:
-                for item in contents:
-                    new_path = item[1].replace('/emby/', '/')
-                    self.conn.execute('UPDATE path SET strPath = "{}" WHERE idPath = "{}"'.format(new_path, item[0]))
-
         return self
 
+    def _connect(self):
+
+        self.path = self._sql(self.db_file)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, cached_statements=self.cached_statements)
+
+        if self.db_file in ('video', 'music', 'texture', 'jellyfin'):
+            conn.execute("PRAGMA journal_mode=WAL")  # to avoid writing conflict with kodi
+
+            for pragma in self._pragmas():
+                conn.execute(pragma)
+
+        LOG.debug("--->[ connection: %s ] %s", self.db_file, id(conn))
+
+        return conn
+
+    def _pragmas(self):
+
+        ''' The connection settings from the add-on settings. They only apply to
+            the connections of the add-on, not to the ones of kodi.
+        '''
+        pragmas = ["PRAGMA synchronous=%s" % SYNCHRONOUS[int(settings('dbSynchronous') or 1)]]
+        pragmas.append("PRAGMA cache_size=-%s" % int(settings('dbCacheSize') or 8192))
+        pragmas.append("PRAGMA mmap_size=%s" % (int(settings('dbMmapSize') or 0) * 1024 * 1024))
+
+        if settings('dbTempStore.bool'):
+            pragmas.append("PRAGMA temp_store=MEMORY")
+
+        return pragmas
+
     def _get_database(self, path, silent=False):
 
         path = xbmc.translatePath(path)
@@ -179,26 +219,75 @@ class Database(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
 
         ''' Close the connection and cursor.
+            A pooled connection stays open, what was not committed is rolled back
+            the same way closing the connection would.
         '''
-        changes = self.conn.total_changes
+        changes = self.conn.total_changes - self.changes
 
         if exc_type is not None:  # errors raised
             LOG.error("type: %s value: %s", exc_type, exc_val)
 
-        if self.commit_close and changes:
+        try:
+            if self.commit_close and changes:
 
-            LOG.debug("[%s] %s rows updated.", self.db_file, changes)
-            self.conn.commit()
+                LOG.debug("[%s] %s rows updated.", self.db_file, changes)
+                self.commit()
+
+            elif changes:
+                self.discarded()
+
+        except Exception:
+            self.discarded()
+
+            raise
+
+        finally:
+            LOG.debug("---<[ database: %s ] %s", self.db_file, id(self.conn))
+            self.cursor.close()
+
+            if self.pooled:
+
+                self.conn.rollback()
+                POOL.busy.discard(self.db_file)
+            else:
+                self.conn.close()
 
-        LOG.debug("---<[ database: %s ] %s", self.db_file, id(self.conn))
-        self.cursor.close()
-        self.conn.close()
+            self.ended()
+
+    def commit(self):
+
+        ''' Commit the transaction, it ends with it.
+        '''
+        self.conn.commit()
+        self.ended()
+
+    def ended(self):
+
+        ''' The transaction was committed, rolled back or the connection closed. The kodi
+            ids allocated from memory are read from the tables again.
+        '''
+        if self.db_file in ('video', 'music'):
+
+            from objects.kodi import reset_entry_ids
+            reset_entry_ids()
+
+    def discarded(self):
+
+        ''' The changes are rolled back, the people and lookup rows added by them are
+            no longer in the kodi database. Drop the caches, they are reloaded on use.
+        '''
+        if self.db_file in ('video', 'music'):
+
+            from objects.kodi import reset_people, reset_lookups
+            reset_people()
+            reset_lookups()
 
 
 def jellyfin_tables(cursor):
 
     ''' Create the tables for the jellyfin database.
-        jellyfin, view, version
+        jellyfin, view, version, library_index
+        Schema changes are applied by database.migrations.
     '''
     cursor.execute(
         """CREATE TABLE IF NOT EXISTS jellyfin(
@@ -209,12 +298,11 @@ def jellyfin_tables(cursor):
         """CREATE TABLE IF NOT EXISTS view(
         view_id TEXT UNIQUE, view_name TEXT, media_type TEXT)""")
     cursor.execute("CREATE TABLE IF NOT EXISTS version(idVersion TEXT)")
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS library_index(
+        jellyfin_id TEXT UNIQUE, library_id TEXT)""")
 
-    columns = cursor.execute("SELECT * FROM jellyfin")
-    if 'jellyfin_parent_id' not in [description[0] for description in columns.description]:
-
-        LOG.debug("Add missing column jellyfin_parent_id")
-        cursor.execute("ALTER TABLE jellyfin ADD COLUMN jellyfin_parent_id 'TEXT'")
+    migrations.migrate(cursor, 'jellyfin', migrations.JELLYFIN)
 
 
 def reset():
@@ -227,7 +315,7 @@ def reset():
     if not dialog("yesno", "{jellyfin}", translate(33074)):
         return
 
-    window('jellyfin_should_stop.bool', True)
+    STOP.stop()
     count = 10
 
     while window('jellyfin_sync.bool'):
@@ -339,37 +427,216 @@ def reset_artwork():
     LOG.info("[ reset artwork ]")
 
 
-def get_sync():
+class SyncState(object):
 
-    if not xbmcvfs.exists(ADDON_DATA):
-        xbmcvfs.mkdirs(ADDON_DATA)
+    ''' The content of sync.json, kept in memory.
+        Readers get a copy of the state. Writers replace it or update some of its keys,
+        the file is then written behind after a short delay, through a temporary file
+        renamed over the previous one. Changes saved by another process are picked up
+        by looking at the modification time of the file, once per second at most, and
+        again before writing: the keys changed here are then applied over the file.
+    '''
+    delay = 1
+    interval = 1
 
-    try:
-        with open(os.path.join(ADDON_DATA, 'sync.json'), 'rb') as infile:
-            sync = json.load(infile, encoding='utf-8')
-    except Exception:
-        sync = {}
+    def __init__(self, path):
+
+        self.path = path
+        self.lock = threading.RLock()
+        self.state = None
+        self.whitelist = None
+        self.mtime = None
+        self.checked = 0
+        self.timer = None
+        self.changes = set()  # None when the whole state was replaced
+
+    def get(self):
+
+        with self.lock:
+            self._refresh()
+
+            return copy.deepcopy(self.state)
+
+    def get_whitelist(self):
+
+        ''' The whitelisted library ids, without the Mixed: prefix.
+        '''
+        with self.lock:
+            self._refresh()
+
+            if self.whitelist is None:
+                self.whitelist = frozenset(x.replace('Mixed:', "") for x in self.state['Whitelist'])
+
+            return self.whitelist
+
+    def replace(self, sync):
+
+        with self.lock:
 
-    sync['Libraries'] = sync.get('Libraries', [])
-    sync['RestorePoint'] = sync.get('RestorePoint', {})
-    sync['Whitelist'] = list(set(sync.get('Whitelist', [])))
-    sync['SortedViews'] = sync.get('SortedViews', [])
+            self.changes = None
+            self._set(copy.deepcopy(sync))
 
-    return sync
+    def update(self, **changes):
+
+        with self.lock:
+            self._refresh()
+
+            if self.changes is not None:
+                self.changes.update(changes)
+
+            sync = self.state
+            sync.update(copy.deepcopy(changes))
+            self._set(sync)
+
+    def flush(self):
+
+        ''' Write the pending changes now. A failed write is logged and left pending,
+            the next change or flush tries again.
+        '''
+        with self.lock:
+            if self.timer is None:
+                return
+
+            self.timer.cancel()
+            self.timer = None
+
+            try:
+                self._merge()
+
+                if not xbmcvfs.exists(ADDON_DATA):
+                    xbmcvfs.mkdirs(ADDON_DATA)
+
+                data = json.dumps(self.state, sort_keys=True, indent=4, ensure_ascii=False)
+                if isinstance(data, text_type):
+                    data = data.encode('utf-8')
+
+                temp = "%s.tmp" % self.path
+
+                with open(temp, 'wb') as outfile:
+                    outfile.write(data)
+
+                if hasattr(os, 'replace'):
+                    os.replace(temp, self.path)
+                else:
+                    if os.path.exists(self.path):
+                        os.remove(self.path)
+
+                    os.rename(temp, self.path)
+
+            except Exception as error:
+                LOG.exception(error)
+                self.timer = self._timer()
+
+                return
+
+            self.mtime = os.path.getmtime(self.path)
+            self.checked = time.time()
+            self.changes = set()
+
+    def _timer(self):
+
+        ''' Unstarted placeholder for the pending write, see _set.
+        '''
+        timer = threading.Timer(self.delay, self.flush)
+        timer.daemon = True
+
+        return timer
+
+    def _set(self, sync):
+
+        sync['Date'] = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.state = sync
+        self.whitelist = None
+
+        if self.timer is None or not self.timer.is_alive():
+
+            self.timer = self._timer()
+            self.timer.start()
+
+    def _modified(self):
+
+        try:
+            return os.path.getmtime(self.path) != self.mtime
+        except OSError:
+            return self.mtime is not None
+
+    def _merge(self):
+
+        ''' Another process saved the file since it was read, keep its state and apply
+            the keys changed here on top of it.
+        '''
+        if self.changes is None or not self._modified():
+            return
+
+        state = self.state
+        self._load()
+
+        for key in self.changes | set(['Date']):
+            self.state[key] = state[key]
+
+    def _refresh(self):
+
+        ''' Load the file the first time or after another process saved it.
+        '''
+        if self.state is not None:
+            if time.time() - self.checked < self.interval:
+                return
+
+            self.checked = time.time()
+
+            if self.timer is not None:
+                self._merge()
+
+                return
+
+            if not self._modified():
+                return
+
+        self._load()
+
+    def _load(self):
+
+        self.checked = time.time()
+
+        try:
+            self.mtime = os.path.getmtime(self.path)
+
+            with open(self.path, 'rb') as infile:
+                sync = json.loads(infile.read().decode('utf-8'))
+        except Exception:
+            self.mtime = None
+            sync = {}
+
+        sync['Libraries'] = sync.get('Libraries', [])
+        sync['RestorePoint'] = sync.get('RestorePoint', {})
+        sync['Whitelist'] = list(set(sync.get('Whitelist', [])))
+        sync['SortedViews'] = sync.get('SortedViews', [])
+
+        self.state = sync
+        self.whitelist = None
+
+
+SYNC = SyncState(os.path.join(ADDON_DATA, 'sync.json'))
+
+
+def get_sync():
+    return SYNC.get()
+
+
+def get_whitelist():
+    return SYNC.get_whitelist()
 
 
 def save_sync(sync):
+    SYNC.replace(sync)
 
-    if not xbmcvfs.exists(ADDON_DATA):
-        xbmcvfs.mkdirs(ADDON_DATA)
 
-    sync['Date'] = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+def update_sync(**changes):
+    SYNC.update(**changes)
+
 
-    with open(os.path.join(ADDON_DATA, 'sync.json'), 'wb') as outfile:
-        data = json.dumps(sync, sort_keys=True, indent=4, ensure_ascii=False)
-        if isinstance(data, text_type):
-            data = data.encode('utf-8')
-        outfile.write(data)
+def flush_sync():
+    SYNC.flush()
 
 
 def get_credentials():
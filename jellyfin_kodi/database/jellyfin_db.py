@@ -4,6 +4,7 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 
 from database import queries as QU
 from helper import LazyLogger
+from helper.utils import split_list
 
 ##################################################################################################
 
@@ -28,6 +29,9 @@ class JellyfinDatabase():
     def update_reference(self, *args):
         self.cursor.execute(QU.update_reference, args)
 
+    def update_fingerprint(self, *args):
+        self.cursor.execute(QU.update_fingerprint, args)
+
     def update_parent_id(self, *args):
 
         ''' Parent_id is the parent Kodi id.
@@ -59,6 +63,11 @@ class JellyfinDatabase():
 
         return self.cursor.fetchall()
 
+    def get_fingerprints(self):
+        self.cursor.execute(QU.get_fingerprints)
+
+        return self.cursor.fetchall()
+
     def get_item_by_kodi_id(self, *args):
 
         try:
@@ -91,9 +100,35 @@ class JellyfinDatabase():
 
         return self.cursor.fetchall()
 
+    def get_items_by_ids(self, item_ids):
+        return self._get_items_in(QU.get_items_by_ids, item_ids)
+
+    def get_items_by_parent_ids(self, parent_ids, media_type):
+        return self._get_items_in(QU.get_items_by_parent_ids, parent_ids, (media_type,))
+
+    def get_items_by_jellyfin_parent_ids(self, parent_ids):
+        return self._get_items_in(QU.get_items_by_jellyfin_parent_ids, parent_ids)
+
+    def _get_items_in(self, query, ids, args=()):
+
+        ''' Run a query with an IN ({}) clause for many ids, in chunks below
+            the sqlite limit of variables per statement.
+        '''
+        items = []
+
+        for chunk in split_list(list(ids), 500):
+
+            self.cursor.execute(query.format(",".join("?" * len(chunk))), args + tuple(chunk))
+            items.extend(self.cursor.fetchall())
+
+        return items
+
     def remove_item(self, *args):
         self.cursor.execute(QU.delete_item, args)
 
+    def remove_items(self, item_ids):
+        self.cursor.executemany(QU.delete_item, [(item_id,) for item_id in item_ids])
+
     def remove_items_by_parent_id(self, *args):
         self.cursor.execute(QU.delete_item_by_parent, args)
 
@@ -103,6 +138,32 @@ class JellyfinDatabase():
     def remove_wild_item(self, item_id):
         self.cursor.execute(QU.delete_item_by_wild, (item_id + "%",))
 
+    def get_media_folder_by_parent_id(self, *args):
+
+        try:
+            self.cursor.execute(QU.get_media_folder_by_parent_id, args)
+
+            return self.cursor.fetchone()[0]
+        except TypeError:
+            return
+
+    def get_library_index(self, *args):
+
+        ''' Library id of a server folder, as recorded from a previous ancestors lookup.
+        '''
+        try:
+            self.cursor.execute(QU.get_library_index, args)
+
+            return self.cursor.fetchone()[0]
+        except TypeError:
+            return
+
+    def add_library_index(self, library_id, item_ids):
+        self.cursor.executemany(QU.add_library_index, [(item_id, library_id) for item_id in item_ids])
+
+    def remove_library_index(self, *args):
+        self.cursor.execute(QU.delete_library_index, args)
+
     def get_view_name(self, item_id):
 
         try:
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+#################################################################################################
+
+from database import queries as QU
+from helper import LazyLogger
+
+##################################################################################################
+
+LOG = LazyLogger(__name__)
+
+##################################################################################################
+
+
+def add_jellyfin_parent_id(cursor):
+
+    ''' Databases created before jellyfin_parent_id was introduced.
+    '''
+    cursor.execute("PRAGMA table_info(jellyfin)")
+
+    if 'jellyfin_parent_id' not in [column[1] for column in cursor.fetchall()]:
+
+        LOG.debug("Add missing column jellyfin_parent_id")
+        cursor.execute("ALTER TABLE jellyfin ADD COLUMN jellyfin_parent_id 'TEXT'")
+
+
+def add_indexes(cursor):
+
+    ''' Indexes for the lookups done by queries.py besides jellyfin_id.
+    '''
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jellyfin_kodi_id_media_type ON jellyfin(kodi_id, media_type)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jellyfin_parent_id_media_type ON jellyfin(parent_id, media_type)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jellyfin_media_folder ON jellyfin(media_folder)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jellyfin_jellyfin_parent_id ON jellyfin(jellyfin_parent_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_library_index_library_id ON library_index(library_id)")
+
+
+def add_fingerprint(cursor):
+
+    ''' Content fingerprint of the synced items, see helper.fingerprint.
+    '''
+    cursor.execute("PRAGMA table_info(jellyfin)")
+
+    if 'fingerprint' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE jellyfin ADD COLUMN fingerprint TEXT")
+
+
+def remove_emby_paths(cursor):
+
+    ''' #162: music paths synced by the emby add-on still contain /emby/.
+    '''
+    cursor.execute("UPDATE path SET strPath = replace(strPath, '/emby/', '/') WHERE strPath LIKE '%/emby/%'")
+
+
+# Ordered migrations per database: (version, description, function).
+# Append new entries, never reorder or remove applied ones.
+JELLYFIN = [
+    (1, "add jellyfin_parent_id column", add_jellyfin_parent_id),
+    (2, "add lookup indexes", add_indexes),
+    (3, "add fingerprint column", add_fingerprint)
+]
+MUSIC = [
+    (1, "remove /emby/ from paths", remove_emby_paths)
+]
+
+
+def migrate(cursor, name, migrations, versions=None):
+
+    ''' Apply the pending migrations in order. Every migration is idempotent and
+        committed on its own, then recorded in the jellyfin version table as
+        name:version. No savepoint: python 2 sqlite3 commits before any DDL. A failed
+        migration is rolled back and stops the run, so it will be retried on the next
+        start, and a migration committed without its version row is simply run again.
+
+        versions: cursor of the jellyfin database, when migrating another database.
+    '''
+    versions = versions or cursor
+    versions.execute(QU.get_version)
+    applied = set(version[0] for version in versions.fetchall())
+
+    for version, description, migration in migrations:
+        version_id = "%s:%s" % (name, version)
+
+        if version_id in applied:
+            continue
+
+        LOG.info("--[ migration %s ] %s", version_id, description)
+
+        try:
+            migration(cursor)
+            cursor.connection.commit()
+
+            versions.execute(QU.add_version, (version_id,))
+            versions.connection.commit()
+        except Exception as error:
+
+            LOG.exception(error)
+            cursor.connection.rollback()
+            versions.connection.rollback()
+
+            return False
+
+    return True
@@ -2,7 +2,7 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 
 get_item = """
 SELECT      kodi_id, kodi_fileid, kodi_pathid, parent_id, media_type,
-            jellyfin_type, media_folder, jellyfin_parent_id
+            jellyfin_type, media_folder, jellyfin_parent_id, fingerprint
 FROM        jellyfin
 WHERE       jellyfin_id = ?
 """
@@ -50,6 +50,10 @@ SELECT      jellyfin_id, checksum
 FROM        jellyfin
 WHERE       jellyfin_type = ?
 """
+get_fingerprints = """
+SELECT      jellyfin_id, jellyfin_type, fingerprint
+FROM        jellyfin
+"""
 get_view_name = """
 SELECT      view_name
 FROM        view
@@ -60,6 +64,22 @@ SELECT      jellyfin_type
 FROM        jellyfin
 WHERE       jellyfin_id = ?
 """
+get_items_by_ids = """
+SELECT      jellyfin_id, kodi_id, kodi_fileid, kodi_pathid, parent_id, media_type
+FROM        jellyfin
+WHERE       jellyfin_id IN ({})
+"""
+get_items_by_parent_ids = """
+SELECT      jellyfin_id, kodi_id, kodi_fileid, kodi_pathid, parent_id, media_type
+FROM        jellyfin
+WHERE       media_type = ?
+AND         parent_id IN ({})
+"""
+get_items_by_jellyfin_parent_ids = """
+SELECT      jellyfin_id, kodi_id, kodi_fileid, kodi_pathid, parent_id, media_type
+FROM        jellyfin
+WHERE       jellyfin_parent_id IN ({})
+"""
 get_media_by_parent_id = """
 SELECT      jellyfin_id, jellyfin_type, kodi_id, kodi_fileid
 FROM        jellyfin
@@ -84,6 +104,18 @@ SELECT      jellyfin_id
 FROM        jellyfin
 WHERE       media_type = ?
 """
+get_media_folder_by_parent_id = """
+SELECT      media_folder
+FROM        jellyfin
+WHERE       jellyfin_parent_id = ?
+AND         media_folder IS NOT NULL
+LIMIT       1
+"""
+get_library_index = """
+SELECT      library_id
+FROM        library_index
+WHERE       jellyfin_id = ?
+"""
 get_version = """
 SELECT      idVersion
 FROM        version
@@ -104,6 +136,10 @@ add_reference_mvideo_obj = ["{Id}", "{MvideoId}", "{FileId}", "{PathId}", "Music
 add_reference_artist_obj = ["{Id}", "{ArtistId}", None, None, "{ArtistType}", "artist", None, "{Checksum}", "{LibraryId}", "{JellyfinParentId}"]
 add_reference_album_obj = ["{Id}", "{AlbumId}", None, None, "MusicAlbum", "album", None, "{Checksum}", None, "{JellyfinParentId}"]
 add_reference_song_obj = ["{Id}", "{SongId}", None, "{PathId}", "Audio", "song", "{AlbumId}", "{Checksum}", None, "{JellyfinParentId}"]
+add_library_index = """
+INSERT OR REPLACE INTO      library_index(jellyfin_id, library_id)
+VALUES                      (?, ?)
+"""
 add_view = """
 INSERT OR REPLACE INTO      view(view_id, view_name, media_type)
 VALUES                      (?, ?, ?)
@@ -119,6 +155,12 @@ SET         checksum = ?
 WHERE       jellyfin_id = ?
 """
 update_reference_obj = ["{Checksum}", "{Id}"]
+update_fingerprint = """
+UPDATE      jellyfin
+SET         fingerprint = ?
+WHERE       jellyfin_id = ?
+"""
+update_fingerprint_obj = ["{Fingerprint}", "{Id}"]
 update_parent = """
 UPDATE      jellyfin
 SET         parent_id = ?
@@ -154,6 +196,10 @@ delete_item_by_wild = """
 DELETE FROM     jellyfin
 WHERE           jellyfin_id LIKE ?
 """
+delete_library_index = """
+DELETE FROM     library_index
+WHERE           library_id = ?
+"""
 delete_view = """
 DELETE FROM     view
 WHERE           view_id = ?
@@ -7,11 +7,11 @@ import threading
 import concurrent.futures
 from datetime import date
 
-from six.moves import range, queue as Queue, zip
+from six.moves import range, queue as Queue
 
 from kodi_six import xbmc
 import requests
-from helper import settings, stop, event, window, create_id
+from helper import settings, stop, event, window, create_id, STOP
 from jellyfin import Jellyfin
 from jellyfin import api
 from helper.exceptions import HTTPException
@@ -22,6 +22,7 @@ from helper import LazyLogger
 LOG = LazyLogger(__name__)
 LIMIT = min(int(settings('limitIndex') or 50), 50)
 DTHREADS = int(settings('limitThreads') or 3)
+PAGES_IN_FLIGHT = DTHREADS * 2
 
 #################################################################################################
 
@@ -189,40 +190,55 @@ def get_items(parent_id, item_type=None, basic=False, params=None):
         yield items
 
 
-def get_artists(parent_id=None):
+def get_items_modified(parent_id, date, item_type=None, userdata=False):
+
+    ''' Items saved since date. With userdata, the items for which the userdata of
+        the current user was saved since date.
+    '''
+    params = {'MinDateLastSavedForUser' if userdata else 'MinDateLastSaved': date}
+
+    for items in get_items(parent_id, item_type, False, params):
+        yield items
 
-    url = "Artists"
 
+def get_manifest(parent_id, item_type=None, unfiltered=False):
+
+    ''' Only the Id, Etag and ParentId of the items, to compare with the jellyfin database.
+        unfiltered: include the missing and virtual items, like Shows/{Id}/Seasons does.
+    '''
     params = {
-        'UserId': "{UserId}",
-        'ParentId': parent_id,
-        'SortBy': "SortName",
-        'SortOrder': "Ascending",
-        'Fields': api.music_info(),
-        'CollapseBoxSetItems': False,
-        'IsVirtualUnaired': False,
-        'EnableTotalRecordCount': False,
-        'LocationTypes': "FileSystem,Remote,Offline",
-        'IsMissing': False,
-        'Recursive': True
+        'Fields': "Etag,ParentId",
+        'EnableImages': False,
+        'EnableUserData': False
     }
+    if unfiltered:
+        params.update({'IsMissing': None, 'IsVirtualUnaired': None, 'LocationTypes': None})
 
-    return _get(url, params)
+    for items in get_items(parent_id, item_type, True, params):
+        yield items
 
 
-def get_library_items(library_id, item_type):
-    url = "Users/{UserId}/Items"
+def get_artists(parent_id=None):
 
-    params = {
-        'ParentId': library_id,
-        'IncludeItemTypes': item_type,
-        'SortBy': "SortName",
-        'SortOrder': "Ascending",
-        'Fields': api.info(),
-        'Recursive': True,
+    query = {
+        'url': "Artists",
+        'params': {
+            'UserId': "{UserId}",
+            'ParentId': parent_id,
+            'SortBy': "SortName",
+            'SortOrder': "Ascending",
+            'Fields': api.music_info(),
+            'CollapseBoxSetItems': False,
+            'IsVirtualUnaired': False,
+            'EnableTotalRecordCount': False,
+            'LocationTypes': "FileSystem,Remote,Offline",
+            'IsMissing': False,
+            'Recursive': True
+        }
     }
+    for items in _get_items(query):
+        yield items
 
-    return _get(url, params)
 
 def get_albums_by_artist(artist_id, basic=False):
 
@@ -255,6 +271,7 @@ def _get_items(query, server_id=None):
     items = {
         'Items': [],
         'TotalRecordCount': 0,
+        'StartIndex': 0,
         'RestorePoint': {}
     }
 
@@ -287,33 +304,53 @@ def _get_items(query, server_id=None):
             in range(params['StartIndex'], items['TotalRecordCount'], LIMIT)
         ]
 
-        # multiprocessing.dummy.Pool completes all requests in multiple threads but has to
-        # complete all tasks before allowing any results to be processed. ThreadPoolExecutor
-        # allows for completed tasks to be processed while other tasks are completed on other
-        # threads. Dont be a dummy.Pool, be a ThreadPoolExecutor
-        p = concurrent.futures.ThreadPoolExecutor(DTHREADS)
-
-        results = p.map(lambda params: _get(url, params, server_id=server_id), query_params)
-
-        for params, result in zip(query_params, results):
-            query['params'] = params
-
-            result = result or {'Items': []}
-
-            # Mitigates #216 till the server validates the date provided is valid
-            if result['Items'][0].get('ProductionYear'):
-                try:
-                    date(result['Items'][0]['ProductionYear'], 1, 1)
-                except ValueError:
-                    LOG.info('#216 mitigation triggered. Setting ProductionYear to None')
-                    result['Items'][0]['ProductionYear'] = None
-
-            items['Items'].extend(result['Items'])
-            # Using items to return data and communicate a restore point back to the callee is
-            # a violation of the SRP. TODO: Seperate responsibilities.
-            items['RestorePoint'] = query
-            yield items
-            del items['Items'][:]
+        # Keep a bounded number of pages in flight and hand them out as soon as they are
+        # downloaded, so a slow page does not hold back the ones completed after it while
+        # the caller writes to the database. Pages are not yielded in order, StartIndex is
+        # the offset of the yielded page and the restore point is the oldest page that was
+        # not fully processed yet.
+        # The caller may hold the library lock between pages, it only waits on the network
+        # when none of the pages in flight has arrived yet.
+        pending = {}
+        unfinished = list(query_params)
+        query_params = iter(query_params)
+
+        def submit(executor):
+            page_params = next(query_params, None)
+
+            if page_params is not None:
+                pending[executor.submit(_get, url, page_params, server_id=server_id)] = page_params
+
+        with concurrent.futures.ThreadPoolExecutor(DTHREADS) as executor:
+
+            for _ in range(PAGES_IN_FLIGHT):
+                submit(executor)
+
+            while pending:
+                done, not_done = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    page_params = pending.pop(future)
+                    result = future.result() or {'Items': []}
+
+                    # Mitigates #216 till the server validates the date provided is valid
+                    if result['Items'] and result['Items'][0].get('ProductionYear'):
+                        try:
+                            date(result['Items'][0]['ProductionYear'], 1, 1)
+                        except ValueError:
+                            LOG.info('#216 mitigation triggered. Setting ProductionYear to None')
+                            result['Items'][0]['ProductionYear'] = None
+
+                    query['params'] = unfinished[0]
+                    items['Items'].extend(result['Items'])
+                    items['StartIndex'] = page_params['StartIndex']
+                    # Using items to return data and communicate a restore point back to the callee is
+                    # a violation of the SRP. TODO: Seperate responsibilities.
+                    items['RestorePoint'] = query
+                    yield items
+                    del items['Items'][:]
+                    unfinished.remove(page_params)
+                    submit(executor)
 
 
 class GetItemWorker(threading.Thread):
@@ -368,7 +405,7 @@ class GetItemWorker(threading.Thread):
 
                 self.queue.task_done()
 
-                if window('jellyfin_should_stop.bool'):
+                if STOP.is_stopping():
                     break
 
 
@@ -403,7 +440,7 @@ class TheVoid(object):
 
                 return response
 
-            if window('jellyfin_should_stop.bool'):
+            if STOP.is_stopping():
                 LOG.info("Abandon mission! A black hole just swallowed [ %s/%s ]", self.method, self.data['VoidName'])
 
                 return
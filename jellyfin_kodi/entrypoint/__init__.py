@@ -4,10 +4,12 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 #################################################################################################
 
 import logging
+from contextlib import contextmanager
 
 from kodi_six import xbmc, xbmcvfs
 
-from helper import LazyLogger
+from database import flush_sync
+from helper import LazyLogger, loghandler
 from jellyfin import Jellyfin
 
 from .default import Events
@@ -19,3 +21,16 @@ from .context import Context
 LOG = LazyLogger(__name__)
 
 #################################################################################################
+
+
+@contextmanager
+def flush_on_exit():
+
+    ''' Wrap the body of a root script. Whatever happens, the pending sync state
+        is written and the log writer drained before the interpreter goes away.
+    '''
+    try:
+        yield
+    finally:
+        flush_sync()
+        loghandler.shutdown()
@@ -101,6 +101,8 @@ class Events(object):
             event('SyncLibrarySelection')
         elif mode == 'removelibs':
             event('RemoveLibrarySelection')
+        elif mode == 'reconcilelibs':
+            event('ReconcileLibrary')
         elif mode == 'addlibs':
             event('AddLibrarySelection')
         elif mode == 'addserver':
@@ -225,6 +227,7 @@ def manage_libraries():
     directory(translate(33154), "plugin://plugin.video.jellyfin/?mode=addlibs", False)
     directory(translate(33139), "plugin://plugin.video.jellyfin/?mode=updatelibs", False)
     directory(translate(33140), "plugin://plugin.video.jellyfin/?mode=repairlibs", False)
+    directory(translate(33202), "plugin://plugin.video.jellyfin/?mode=reconcilelibs", False)
     directory(translate(33184), "plugin://plugin.video.jellyfin/?mode=removelibs", False)
     directory(translate(33060), "plugin://plugin.video.jellyfin/?mode=thememedia", False)
 
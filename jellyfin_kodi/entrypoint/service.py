@@ -18,7 +18,8 @@ import client
 import library
 import monitor
 from views import Views, verify_kodi_defaults
-from helper import translate, window, settings, event, dialog, set_addon_mode
+from database import flush_sync
+from helper import translate, window, settings, invalidate_settings, event, dialog, set_addon_mode, STOP
 from helper.utils import JsonDebugPrinter
 from jellyfin import Jellyfin
 from helper import LazyLogger
@@ -41,7 +42,7 @@ class Service(xbmc.Monitor):
 
     def __init__(self):
 
-        window('jellyfin_should_stop', clear=True)
+        STOP.resume()
 
         self.settings['addon_version'] = client.get_version()
         self.settings['profile'] = xbmc.translatePath('special://profile')
@@ -133,7 +134,7 @@ class Service(xbmc.Monitor):
 
     def stop_default(self):
 
-        window('jellyfin_online', clear=True)
+        STOP.set_online(False)
         Jellyfin().close()
 
         if self.library_thread is not None:
@@ -156,7 +157,8 @@ class Service(xbmc.Monitor):
                               'LibraryChanged', 'ServerOnline', 'SyncLibrary', 'RepairLibrary', 'RemoveLibrary',
                               'SyncLibrarySelection', 'RepairLibrarySelection', 'AddServer',
                               'Unauthorized', 'UserConfigurationUpdated', 'ServerRestarting',
-                              'RemoveServer', 'UpdatePassword', 'AddLibrarySelection', 'RemoveLibrarySelection'):
+                              'RemoveServer', 'UpdatePassword', 'AddLibrarySelection', 'RemoveLibrarySelection',
+                              'ReconcileLibrary'):
                 return
 
             data = json.loads(data)[0]
@@ -171,7 +173,7 @@ class Service(xbmc.Monitor):
         if method == 'ServerOnline':
             if data.get('ServerId') is None:
 
-                window('jellyfin_online.bool', True)
+                STOP.set_online(True)
                 self.settings['auth_check'] = True
                 self.warn = True
 
@@ -261,7 +263,7 @@ class Service(xbmc.Monitor):
             self.library_thread.removed(data['ItemsRemoved'])
 
         elif method == 'System.OnQuit':
-            window('jellyfin_should_stop.bool', True)
+            STOP.stop()
             self.running = False
 
         elif method in ('SyncLibrarySelection', 'RepairLibrarySelection', 'AddLibrarySelection', 'RemoveLibrarySelection'):
@@ -288,6 +290,9 @@ class Service(xbmc.Monitor):
             self.library_thread.add_library(data['Id'])
             xbmc.executebuiltin("Container.Refresh")
 
+        elif method == 'ReconcileLibrary':
+            self.library_thread.request_reconcile()
+
         elif method == 'RemoveLibrary':
             libraries = data['Id'].split(',')
 
@@ -301,7 +306,7 @@ class Service(xbmc.Monitor):
         elif method == 'System.OnSleep':
 
             LOG.info("-->[ sleep ]")
-            window('jellyfin_should_stop.bool', True)
+            STOP.stop()
 
             if self.library_thread is not None:
 
@@ -322,7 +327,7 @@ class Service(xbmc.Monitor):
             LOG.info("--<[ sleep ]")
             xbmc.sleep(10000)  # Allow network to wake up
             self.monitor.sleep = False
-            window('jellyfin_should_stop', clear=True)
+            STOP.resume()
 
             try:
                 self.connect.register()
@@ -344,7 +349,9 @@ class Service(xbmc.Monitor):
 
         ''' React to setting changes that impact window values.
         '''
-        if window('jellyfin_should_stop.bool'):
+        invalidate_settings()
+
+        if STOP.is_stopping():
             return
 
         if settings('logLevel') != self.settings['log_level']:
@@ -407,7 +414,7 @@ class Service(xbmc.Monitor):
     def shutdown(self):
 
         LOG.info("---<[ EXITING ]")
-        window('jellyfin_should_stop.bool', True)
+        STOP.stop()
 
         properties = [  # TODO: review
             "jellyfin_state", "jellyfin_serverStatus", "jellyfin_currUser",
@@ -429,4 +436,5 @@ class Service(xbmc.Monitor):
             self.monitor.listener.stop()
             self.monitor.webservice.stop()
 
+        flush_sync()
         LOG.info("---<<<[ %s ]", client.get_addon_name())
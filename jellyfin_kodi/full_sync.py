@@ -12,7 +12,7 @@ import downloader as server
 import helper.xmls as xmls
 from objects import Movies, TVShows, MusicVideos, Music
 from database import Database, get_sync, save_sync, jellyfin_db
-from helper import translate, settings, window, progress, dialog
+from helper import translate, settings, window, progress, dialog, api
 from helper.utils import get_screensaver, set_screensaver
 from helper import LazyLogger
 from helper.exceptions import LibraryException, PathValidationException
@@ -179,6 +179,7 @@ class FullSync(object):
         '''
         LOG.info("starting sync with %s", self.sync['Libraries'])
         save_sync(self.sync)
+        self.context = api.SyncContext.create(self.server)
         start_time = datetime.datetime.now()
 
         for library in list(self.sync['Libraries']):
@@ -268,6 +269,17 @@ class FullSync(object):
                 with Database('jellyfin') as jellyfindb:
                     yield videodb, jellyfindb
 
+    def checkpoint(self, *databases):
+
+        ''' Commit the page that was just written, so the databases match the
+            restore point while the connections stay open for the whole library.
+        '''
+        for database in databases:
+            database.commit()
+
+    def log_lookups(self, library, obj):
+        LOG.info("[ lookups/%s ] %s", library['Name'], obj.lookups.stats())
+
     @progress()
     def movies(self, library, dialog):
 
@@ -275,13 +287,13 @@ class FullSync(object):
         '''
         processed_ids = []
 
-        for items in server.get_items(library['Id'], "Movie", False, self.sync['RestorePoint'].get('params')):
+        with self.video_database_locks() as (videodb, jellyfindb):
+            obj = Movies(self.server, jellyfindb, videodb, self.direct_path, library, context=self.context)
 
-            with self.video_database_locks() as (videodb, jellyfindb):
-                obj = Movies(self.server, jellyfindb, videodb, self.direct_path, library)
+            for items in server.get_items(library['Id'], "Movie", False, self.sync['RestorePoint'].get('params')):
 
                 self.sync['RestorePoint'] = items['RestorePoint']
-                start_index = items['RestorePoint']['params']['StartIndex']
+                start_index = items['StartIndex']
 
                 for index, movie in enumerate(items['Items']):
 
@@ -291,9 +303,10 @@ class FullSync(object):
                     obj.movie(movie)
                     processed_ids.append(movie['Id'])
 
-        with self.video_database_locks() as (videodb, jellyfindb):
-            obj = Movies(self.server, jellyfindb, videodb, self.direct_path, library)
+                self.checkpoint(videodb, jellyfindb)
+
             obj.item_ids = processed_ids
+            self.log_lookups(library, obj)
 
             if self.update_library:
                 self.movies_compare(library, obj, jellyfindb)
@@ -302,14 +315,19 @@ class FullSync(object):
 
         ''' Compare entries from library to what's in the jellyfindb. Remove surplus
         '''
-        db = jellyfin_db.JellyfinDatabase(jellyfinydb.cursor)
+        self.remove_surplus(library, obj, jellyfinydb, 'Movie')
 
-        items = db.get_item_by_media_folder(library['Id'])
-        current = obj.item_ids
+    def remove_surplus(self, library, obj, jellyfindb, item_type):
 
-        for x in items:
-            if x[0] not in current and x[1] == 'Movie':
-                obj.remove(x[0])
+        ''' Remove the items of the library that were not processed by obj, in bulk.
+            The removals share the transaction of the sync that processed the library.
+        '''
+        db = jellyfin_db.JellyfinDatabase(jellyfindb.cursor)
+        current = set(obj.item_ids)
+        surplus = [x[0] for x in db.get_item_by_media_folder(library['Id']) if x[1] == item_type and x[0] not in current]
+
+        if surplus:
+            LOG.info("Removed from %s: %s", library['Name'], obj.remove_items(surplus))
 
     @progress()
     def tvshows(self, library, dialog):
@@ -317,14 +335,19 @@ class FullSync(object):
         ''' Process tvshows and episodes from a single library.
         '''
         processed_ids = []
+        batched = settings('syncTvBatched.bool')
 
-        for items in server.get_items(library['Id'], "Series", False, self.sync['RestorePoint'].get('params')):
+        if batched:
+            dialog.update(0, heading="%s: %s" % (translate('addon_name'), library['Name']), message=translate('gathering'))
+            seasons, episodes = self.get_tvshow_children(library)
 
-            with self.video_database_locks() as (videodb, jellyfindb):
-                obj = TVShows(self.server, jellyfindb, videodb, self.direct_path, library, True)
+        with self.video_database_locks() as (videodb, jellyfindb):
+            obj = TVShows(self.server, jellyfindb, videodb, self.direct_path, library, True, context=self.context)
+
+            for items in server.get_items(library['Id'], "Series", False, self.sync['RestorePoint'].get('params')):
 
                 self.sync['RestorePoint'] = items['RestorePoint']
-                start_index = items['RestorePoint']['params']['StartIndex']
+                start_index = items['StartIndex']
 
                 for index, show in enumerate(items['Items']):
 
@@ -332,36 +355,63 @@ class FullSync(object):
                     message = show['Name']
                     dialog.update(percent, heading="%s: %s" % (translate('addon_name'), library['Name']), message=message)
 
-                    if obj.tvshow(show) is not False:
+                    if batched:
+                        if obj.tvshow(show, seasons=seasons.pop(show['Id'], [])) is not False:
+
+                            for episode in episodes.pop(show['Id'], []):
+
+                                dialog.update(percent, message="%s/%s" % (message, episode['Name'][:10]))
+                                obj.episode(episode)
 
-                        for episodes in server.get_episode_by_show(show['Id']):
-                            for episode in episodes['Items']:
+                    elif obj.tvshow(show) is not False:
+
+                        for episodes_page in server.get_episode_by_show(show['Id']):
+                            for episode in episodes_page['Items']:
 
                                 dialog.update(percent, message="%s/%s" % (message, episode['Name'][:10]))
                                 obj.episode(episode)
                     processed_ids.append(show['Id'])
 
-        with self.video_database_locks() as (videodb, jellyfindb):
-            obj = TVShows(self.server, jellyfindb, videodb, self.direct_path, library, True)
+                self.checkpoint(videodb, jellyfindb)
+
             obj.item_ids = processed_ids
+            self.log_lookups(library, obj)
             if self.update_library:
                 self.tvshows_compare(library, obj, jellyfindb)
 
-    def tvshows_compare(self, library, obj, jellyfindb):
+    def get_tvshow_children(self, library):
 
-        ''' Compare entries from library to what's in the jellyfindb. Remove surplus
+        ''' Page every season and episode of the library once and group them locally
+            by series, instead of requesting them for each show.
+            Episodes are ordered by season and episode number.
         '''
-        db = jellyfin_db.JellyfinDatabase(jellyfindb.cursor)
+        seasons = {}
+        episodes = {}
+
+        for items in server.get_items(library['Id'], "Season"):
+            for season in items['Items']:
+                seasons.setdefault(season['SeriesId'], []).append(season)
+
+        for items in server.get_items(library['Id'], "Episode"):
+            for episode in items['Items']:
+                episodes.setdefault(episode.get('SeriesId'), []).append(episode)
+
+        for series_id in seasons:
+            seasons[series_id].sort(key=lambda x: x.get('IndexNumber') or 0)
 
-        items = db.get_item_by_media_folder(library['Id'])
-        for x in list(items):
-            items.extend(obj.get_child(x[0]))
+        for series_id in episodes:
+            episodes[series_id].sort(key=lambda x: (x.get('ParentIndexNumber') or 0, x.get('IndexNumber') or 0))
 
-        current = obj.item_ids
+        LOG.info("Gathered %s seasons and %s episodes for %s series",
+                 sum(len(x) for x in seasons.values()), sum(len(x) for x in episodes.values()), len(seasons))
+
+        return seasons, episodes
+
+    def tvshows_compare(self, library, obj, jellyfindb):
 
-        for x in items:
-            if x[0] not in current and x[1] == 'Series':
-                obj.remove(x[0])
+        ''' Compare entries from library to what's in the jellyfindb. Remove surplus
+        '''
+        self.remove_surplus(library, obj, jellyfindb, 'Series')
 
     @progress()
     def musicvideos(self, library, dialog):
@@ -370,13 +420,13 @@ class FullSync(object):
         '''
         processed_ids = []
 
-        for items in server.get_items(library['Id'], "MusicVideo", False, self.sync['RestorePoint'].get('params')):
+        with self.video_database_locks() as (videodb, jellyfindb):
+            obj = MusicVideos(self.server, jellyfindb, videodb, self.direct_path, library, context=self.context)
 
-            with self.video_database_locks() as (videodb, jellyfindb):
-                obj = MusicVideos(self.server, jellyfindb, videodb, self.direct_path, library)
+            for items in server.get_items(library['Id'], "MusicVideo", False, self.sync['RestorePoint'].get('params')):
 
                 self.sync['RestorePoint'] = items['RestorePoint']
-                start_index = items['RestorePoint']['params']['StartIndex']
+                start_index = items['StartIndex']
 
                 for index, mvideo in enumerate(items['Items']):
 
@@ -386,9 +436,10 @@ class FullSync(object):
                     obj.musicvideo(mvideo)
                     processed_ids.append(mvideo['Id'])
 
-        with self.video_database_locks() as (videodb, jellyfindb):
-            obj = MusicVideos(self.server, jellyfindb, videodb, self.direct_path, library)
+                self.checkpoint(videodb, jellyfindb)
+
             obj.item_ids = processed_ids
+            self.log_lookups(library, obj)
             if self.update_library:
                 self.musicvideos_compare(library, obj, jellyfindb)
 
@@ -396,58 +447,43 @@ class FullSync(object):
 
         ''' Compare entries from library to what's in the jellyfindb. Remove surplus
         '''
-        db = jellyfin_db.JellyfinDatabase(jellyfindb.cursor)
-
-        items = db.get_item_by_media_folder(library['Id'])
-        current = obj.item_ids
-
-        for x in items:
-            if x[0] not in current and x[1] == 'MusicVideo':
-                obj.remove(x[0])
+        self.remove_surplus(library, obj, jellyfindb, 'MusicVideo')
 
     @progress()
     def music(self, library, dialog):
 
         ''' Process artists, album, songs from a single library.
+            Each is written page by page in that order, so albums find their artists
+            and songs their album already in the database, and nothing more than a
+            page is held in memory.
         '''
+        library_id = library['Id']
+        heading = "%s: %s" % (translate('addon_name'), library['Name'])
+
         with self.library.music_database_lock:
             with Database('music') as musicdb:
                 with Database('jellyfin') as jellyfindb:
-                    obj = Music(self.server, jellyfindb, musicdb, self.direct_path, library)
-
-                    library_id = library['Id']
-
-                    # Get all items in the library to process locally
-                    artists_data = server.get_artists(library_id)
-                    artists = artists_data['Items']
-                    num_artists = artists_data['TotalRecordCount']
-                    albums = server.get_library_items(library_id, 'MusicAlbum')['Items']
-                    songs = server.get_library_items(library_id, 'Audio')['Items']
-
-                    for index, artist in enumerate(artists):
-                        artist_name = artist.get('Name')
-
-                        # Update percentage dialog
-                        percent = int((float(index) / float(num_artists)) * 100)
-                        dialog.update(percent, heading="%s: %s" % (translate('addon_name'), library['Name']), message=artist_name)
-
-                        # Add artist to database
-                        obj.artist(artist)
-
-                        # Get all albums for each artist
-                        artist_albums = [ album for album in albums if artist_name in album.get('Artists') ]
-                        for album in artist_albums:
-                            # Add album to database
-                            obj.album(album)
-                            album_id = album.get('Id')
-                            # Get all songs in each album
-                            album_songs = [ song for song in songs if album_id == song.get('AlbumId') ]
-                            for song in album_songs:
-                                dialog.update(percent,
-                                              message="%s/%s/%s" % (artist_name, album['Name'][:7], song['Name'][:7]))
-                                # Add song to database
-                                obj.song(song)
-#
+                    obj = Music(self.server, jellyfindb, musicdb, self.direct_path, library, context=self.context)
+
+                    for step, (pages, write) in enumerate((
+                            (server.get_artists(library_id), obj.artist),
+                            (server.get_items(library_id, "MusicAlbum"), obj.album),
+                            (server.get_items(library_id, "Audio"), obj.song))):
+
+                        for items in pages:
+                            start_index = items['StartIndex']
+
+                            for index, item in enumerate(items['Items']):
+
+                                # Update percentage dialog, a third for each step
+                                percent = int((step + float(start_index + index) / float(items['TotalRecordCount'] or 1)) * 100 / 3)
+                                dialog.update(percent, heading=heading, message=item.get('Name'))
+                                write(item)
+
+                            self.checkpoint(musicdb, jellyfindb)
+
+                    self.log_lookups(library, obj)
+
                     if self.update_library:
                         self.music_compare(library, obj, jellyfindb)
 
@@ -455,30 +491,20 @@ class FullSync(object):
 
         ''' Compare entries from library to what's in the jellyfindb. Remove surplus
         '''
-        db = jellyfin_db.JellyfinDatabase(jellyfindb.cursor)
-
-        items = db.get_item_by_media_folder(library['Id'])
-        for x in list(items):
-            items.extend(obj.get_child(x[0]))
-
-        current = obj.item_ids
-
-        for x in items:
-            if x[0] not in current and x[1] == 'MusicArtist':
-                obj.remove(x[0])
+        self.remove_surplus(library, obj, jellyfindb, 'MusicArtist')
 
     @progress(translate(33018))
     def boxsets(self, library, dialog=None):
 
         ''' Process all boxsets.
         '''
-        for items in server.get_items(library['Id'], "BoxSet", False, self.sync['RestorePoint'].get('params')):
+        with self.video_database_locks() as (videodb, jellyfindb):
+            obj = Movies(self.server, jellyfindb, videodb, self.direct_path, library, context=self.context)
 
-            with self.video_database_locks() as (videodb, jellyfindb):
-                obj = Movies(self.server, jellyfindb, videodb, self.direct_path, library)
+            for items in server.get_items(library['Id'], "BoxSet", False, self.sync['RestorePoint'].get('params')):
 
                 self.sync['RestorePoint'] = items['RestorePoint']
-                start_index = items['RestorePoint']['params']['StartIndex']
+                start_index = items['StartIndex']
 
                 for index, boxset in enumerate(items['Items']):
 
@@ -487,12 +513,14 @@ class FullSync(object):
                                   message=boxset['Name'])
                     obj.boxset(boxset)
 
+                self.checkpoint(videodb, jellyfindb)
+
     def refresh_boxsets(self, library):
 
         ''' Delete all exisitng boxsets and re-add.
         '''
         with self.video_database_locks() as (videodb, jellyfindb):
-            obj = Movies(self.server, jellyfindb, videodb, self.direct_path, library)
+            obj = Movies(self.server, jellyfindb, videodb, self.direct_path, library, context=self.context)
             obj.boxsets_reset()
 
         self.boxsets(None)
@@ -510,50 +538,34 @@ class FullSync(object):
             library = db.get_view(library_id.replace('Mixed:', ""))
             items = db.get_item_by_media_folder(library_id.replace('Mixed:', ""))
             media = 'music' if library[1] == 'music' else 'video'
+            db.remove_library_index(library_id.replace('Mixed:', ""))
 
             if media == 'music':
                 settings('MusicRescan.bool', False)
 
             if items:
-                count = 0
+                removed = {}
+
+                if media == 'music':
+                    groups = [(Music, ('MusicArtist', 'AlbumArtist'))]
+                else:
+                    groups = [(Movies, ('Movie',)), (TVShows, ('Series',)), (MusicVideos, ('MusicVideo',))]
 
                 with self.library.music_database_lock if media == 'music' else self.library.database_lock:
                     with Database(media) as kodidb:
+                        default_args = (self.server, jellyfindb, kodidb, direct_path)
 
-                        if library[1] == 'mixed':
-
-                            movies = [x for x in items if x[1] == 'Movie']
-                            tvshows = [x for x in items if x[1] == 'Series']
-
-                            obj = Movies(self.server, jellyfindb, kodidb, direct_path, library).remove
-
-                            for item in movies:
-
-                                obj(item[0])
-                                dialog.update(int((float(count) / float(len(items)) * 100)), heading="%s: %s" % (translate('addon_name'), library[0]))
-                                count += 1
+                        for index, (objects, item_types) in enumerate(groups):
+                            item_ids = [x[0] for x in items if x[1] in item_types]
 
-                            obj = TVShows(self.server, jellyfindb, kodidb, direct_path, library).remove
+                            if item_ids:
+                                removed.update(objects(*default_args).remove_items(item_ids))
 
-                            for item in tvshows:
+                            dialog.update(int((float(index + 1) / float(len(groups)) * 100)), heading="%s: %s" % (translate('addon_name'), library[0]))
 
-                                obj(item[0])
-                                dialog.update(int((float(count) / float(len(items)) * 100)), heading="%s: %s" % (translate('addon_name'), library[0]))
-                                count += 1
-                        else:
-                            default_args = (self.server, jellyfindb, kodidb, direct_path)
-                            for item in items:
-                                if item[1] in ('Series', 'Season', 'Episode'):
-                                    TVShows(*default_args).remove(item[0])
-                                elif item[1] in ('Movie', 'BoxSet'):
-                                    Movies(*default_args).remove(item[0])
-                                elif item[1] in ('MusicAlbum', 'MusicArtist', 'AlbumArtist', 'Audio'):
-                                    Music(*default_args).remove(item[0])
-                                elif item[1] == 'MusicVideo':
-                                    MusicVideos(*default_args).remove(item[0])
+                        db.remove_items([x[0] for x in items])
 
-                                dialog.update(int((float(count) / float(len(items)) * 100)), heading="%s: %s" % (translate('addon_name'), library[0]))
-                                count += 1
+                LOG.info("Removed library %s: %s", library[0], removed)
 
         self.sync = get_sync()
 
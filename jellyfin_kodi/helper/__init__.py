@@ -7,6 +7,7 @@ from .translate import translate
 from .utils import addon_id
 from .utils import window
 from .utils import settings
+from .utils import invalidate_settings
 from .utils import kodi_version
 from .utils import dialog
 from .utils import find
@@ -15,14 +16,17 @@ from .utils import validate
 from .utils import validate_bluray_dir
 from .utils import validate_dvd_dir
 from .utils import values
+from .utils import fingerprint
 from .utils import JSONRPC
 from .utils import compare_version
 from .utils import unzip
 from .utils import create_id
 from .utils import convert_to_local as Local
+from .utils import convert_to_kodi_date as KodiDate
 from .utils import has_attribute
 from .utils import set_addon_mode
 from .utils import get_filesystem_encoding
+from .utils import STOP
 
 from .wrapper import progress
 from .wrapper import stop
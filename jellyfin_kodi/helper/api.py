@@ -3,6 +3,8 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 
 ##################################################################################################
 
+from collections import namedtuple
+
 from helper import LazyLogger
 
 from . import settings
@@ -14,14 +16,44 @@ LOG = LazyLogger(__name__)
 ##################################################################################################
 
 
+def get_artwork_query():
+
+    query = ""
+
+    if settings('compressArt.bool'):
+        query = "&Quality=90"
+
+    if not settings('enableCoverArt.bool'):
+        query += "&EnableImageEnhancers=false"
+
+    return query
+
+
+class SyncContext(namedtuple('SyncContext', ['server', 'artwork_query', 'resume_jumpback'])):
+
+    ''' What the item writers need from the server credentials and the settings,
+        resolved once per sync or worker run instead of once per item.
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, server):
+
+        info = server.auth.get_server_info(server.auth.server_id)
+
+        return cls(info.get('address'), get_artwork_query(), int(settings('resumeJumpBack') or 0))
+
+
 class API(object):
-    def __init__(self, item, server=None):
+    def __init__(self, item, server=None, context=None):
 
         ''' Get item information in special cases.
             server is the server address, provide if your functions requires it.
+            context is a SyncContext, it provides the server address as well.
         '''
         self.item = item
-        self.server = server
+        self.server = context.server if context is not None else server
+        self.context = context
 
     def get_playcount(self, played, playcount):
 
@@ -134,13 +166,12 @@ class API(object):
 
         return runtime
 
-    @classmethod
-    def adjust_resume(cls, resume_seconds):
+    def adjust_resume(self, resume_seconds):
 
         resume = 0
         if resume_seconds:
             resume = round(float(resume_seconds), 6)
-            jumpback = int(settings('resumeJumpBack'))
+            jumpback = self.context.resume_jumpback if self.context is not None else int(settings('resumeJumpBack'))
             if resume > jumpback:
                 # To avoid negative bookmark
                 resume = resume - jumpback
@@ -245,7 +276,6 @@ class API(object):
 
             obj is from objects.Objects().map(item, 'Artwork')
         '''
-        query = ""
         all_artwork = {
             'Primary': "",
             'BoxRear': "",
@@ -257,12 +287,7 @@ class API(object):
             'Backdrop': []
         }
 
-        if settings('compressArt.bool'):
-            query = "&Quality=90"
-
-        if not settings('enableCoverArt.bool'):
-            query += "&EnableImageEnhancers=false"
-
+        query = self.context.artwork_query if self.context is not None else get_artwork_query()
         all_artwork['Backdrop'] = self.get_backdrops(obj['Id'], obj['BackdropTags'] or [], query)
 
         for artwork in (obj['Tags'] or []):
@@ -4,10 +4,15 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 ##################################################################################################
 
 import os
+import re
 import logging
+import threading
+import time
 import traceback
+from collections import deque
 
 from six import ensure_text
+from six.moves import queue as Queue
 from kodi_six import xbmc, xbmcaddon
 
 import database
@@ -30,54 +35,188 @@ def getLogger(name=None):
     return __LOGGER.getChild(name)
 
 
+def shutdown():
+
+    ''' Write the queued records and stop the writer thread, at the end of an entrypoint.
+    '''
+    for handler in __LOGGER.handlers:
+
+        if isinstance(handler, LogHandler):
+            handler.stop()
+
+
 class LogHandler(logging.StreamHandler):
 
+    ''' Records are checked against the log level, then handed to a writer thread
+        that formats, masks and passes them to Kodi. With logBuffer, the records
+        below the log level are kept in memory and written out with the next error.
+    '''
+    interval = 1
+    queue_size = 1000
+    buffer_size = 1000
+    levels = {
+        0: logging.WARNING,
+        1: logging.INFO,
+        2: logging.DEBUG
+    }
+
     def __init__(self):
 
         logging.StreamHandler.__init__(self)
         self.setFormatter(MyFormatter())
 
-        self.sensitive = {'Token': [], 'Server': []}
+        self.sensitive = {}
 
         for server in database.get_credentials()['Servers']:
 
             if server.get('AccessToken'):
-                self.sensitive['Token'].append(server['AccessToken'])
+                self.sensitive[server['AccessToken']] = "{jellyfin-token}"
 
             if server.get('address'):
-                self.sensitive['Server'].append(server['address'].split('://')[1])
+                self.sensitive[server['address'].split('://')[1]] = "{jellyfin-server}"
 
-        self.mask_info = settings('maskInfo.bool')
+        self.mask_info = settings('maskInfo.bool') and bool(self.sensitive)
+        self.mask = re.compile("|".join(re.escape(value) for value in sorted(self.sensitive, key=len, reverse=True)))
 
-    def emit(self, record):
+        self.log_level = logging.DEBUG
+        self.buffered = False
+        self.checked = 0
+        self.buffer = deque(maxlen=self.buffer_size)
+        self.queue = Queue.Queue(self.queue_size)
+        self.dropped = 0
+        self.writer = None
+        self.writer_lock = threading.Lock()
+        self.stopped = False
+
+    def get_log_level(self):
+
+        now = time.time()
+
+        if now - self.checked > self.interval:
+            self.checked = now
+
+            try:
+                self.log_level = self.levels.get(int(settings('logLevel')), logging.DEBUG)
+            except ValueError:
+                self.log_level = logging.DEBUG  # If getting settings fail, we probably want debug logging.
+
+            self.buffered = settings('logBuffer.bool')
+
+        return self.log_level
+
+    def handle(self, record):
+
+        ''' Runs on the thread logging, keep it short. The message is merged here,
+            the arguments could be changed by the time the writer gets to them.
+        '''
+        if not self.filter(record):
+            return False
+
+        if record.levelno >= self.get_log_level():
+            self.put(record)
+        elif self.buffered:
+            self.prepare(record)
+            self.buffer.append(record)
+
+        return True
+
+    def prepare(self, record):
+
+        record.msg = record.getMessage()
+        record.args = None
+
+    def put(self, record):
+
+        self.prepare(record)
+
+        if record.levelno >= logging.ERROR and self.buffer:
+
+            records = list(self.buffer)
+            self.buffer.clear()
 
-        if self._get_log_level(record.levelno):
-            string = self.format(record)
+            for buffered in records:
+                self.put(buffered)
 
-            if self.mask_info:
-                for server in self.sensitive['Server']:
-                    string = string.replace(server or "{server}", "{jellyfin-server}")
+        with self.writer_lock:
 
-                for token in self.sensitive['Token']:
-                    string = string.replace(token or "{token}", "{jellyfin-token}")
+            if self.stopped:  # nobody would join a new writer, write it from here
+                self.write_record(record)
 
-            xbmc.log(string, level=xbmc.LOGNOTICE)
+                return
 
-    @classmethod
-    def _get_log_level(cls, level):
+            if self.writer is None or not self.writer.is_alive():
+
+                self.writer = threading.Thread(target=self.write, name="LogWriter")
+                self.writer.daemon = True
+                self.writer.start()
+
+            try:
+                self.queue.put_nowait(record)
+            except Queue.Full:
+
+                if record.levelno < logging.WARNING:
+                    self.dropped += 1
+                else:
+                    self.queue.put(record)
+
+    def write(self):
+
+        while True:
+            record = self.queue.get()
+
+            if record is None:  # stop
+                self.queue.task_done()
+
+                return
+
+            try:
+                self.write_record(record)
+            finally:
+                self.queue.task_done()
+
+    def write_record(self, record):
 
-        levels = {
-            logging.ERROR: 0,
-            logging.WARNING: 0,
-            logging.INFO: 1,
-            logging.DEBUG: 2
-        }
         try:
-            log_level = int(settings('logLevel'))
-        except ValueError:
-            log_level = 2  # If getting settings fail, we probably want debug logging.
+            if self.dropped:
+
+                dropped, self.dropped = self.dropped, 0
+                xbmc.log("%s -> WARNING:: %s records dropped, the log queue was full" % (record.name, dropped), level=xbmc.LOGNOTICE)
+
+            self.emit(record)
+        except Exception:
+            self.handleError(record)
+
+    def emit(self, record):
+
+        string = self.format(record)
+
+        if self.mask_info:
+            string = self.mask.sub(lambda match: self.sensitive[match.group(0)], string)
+
+        xbmc.log(string, level=xbmc.LOGNOTICE)
+
+    def flush(self):
+
+        ''' Wait for the writer to catch up.
+        '''
+        if self.writer is not None and self.writer.is_alive():
+            self.queue.join()
+
+    def stop(self):
+
+        ''' Write what is queued and end the writer thread. What is logged afterwards
+            is written by the thread logging it.
+        '''
+        with self.writer_lock:
+
+            self.stopped = True
+            writer = self.writer
+
+            if writer is not None and writer.is_alive():
+                self.queue.put(None)
 
-        return log_level >= levels[level]
+        if writer is not None:
+            writer.join()
 
 
 class MyFormatter(logging.Formatter):
@@ -4,10 +4,13 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 #################################################################################################
 
 import binascii
+import datetime
+import hashlib
 import json
 import os
 import sys
 import re
+import time
 import unicodedata
 from uuid import uuid4
 from distutils.version import LooseVersion
@@ -25,6 +28,10 @@ from .translate import translate
 #################################################################################################
 
 LOG = LazyLogger(__name__)
+ISO_DATE = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.\d+)?(?:Z|[+-]\d\d:?\d\d)?$')
+TZ_UTC = tz.tzutc()
+TZ_LOCAL = tz.tzlocal()
+LOCAL_OFFSETS = {}
 
 #################################################################################################
 
@@ -71,22 +78,76 @@ def window(key, value=None, clear=False, window_id=10000):
         return result
 
 
+class SettingsCache(object):
+
+    ''' The values of the add-on settings, read from Kodi the first time they are
+        used. A write goes to Kodi and to this cache only. Kodi then tells the
+        service the settings changed, which bumps a version in a window property,
+        and every entrypoint drops its cache. The property is looked at once per
+        second at most.
+    '''
+    interval = 1
+    version_key = 'jellyfin_settings_version'
+
+    def __init__(self):
+
+        self.values = {}
+        self.version = None
+        self.checked = 0
+
+    def get(self, setting):
+
+        now = time.time()
+
+        if now - self.checked > self.interval:
+
+            self.checked = now
+            version = window(self.version_key)
+
+            if version != self.version:
+
+                self.version = version
+                self.values = {}
+
+        try:
+            return self.values[setting]
+        except KeyError:
+            value = self.values[setting] = xbmcaddon.Addon(addon_id()).getSetting(setting)
+
+            return value
+
+    def set(self, setting, value):
+
+        xbmcaddon.Addon(addon_id()).setSetting(setting, value)
+        self.values[setting] = value
+
+    def invalidate(self):
+
+        ''' Let every entrypoint know the settings changed, from onSettingsChanged.
+        '''
+        self.values = {}
+        self.version = text_type(int(window(self.version_key) or 0) + 1)
+        self.checked = time.time()
+        window(self.version_key, self.version)
+
+
+SETTINGS = SettingsCache()
+
+
 def settings(setting, value=None):
 
     ''' Get or add add-on settings.
         getSetting returns unicode object.
     '''
-    addon = xbmcaddon.Addon(addon_id())
-
     if value is not None:
         if setting.endswith('.bool'):
 
             setting = setting.replace('.bool', "")
             value = "true" if value else "false"
 
-        addon.setSetting(setting, value)
+        SETTINGS.set(setting, value)
     else:
-        result = addon.getSetting(setting.replace('.bool', ""))
+        result = SETTINGS.get(setting.replace('.bool', ""))
 
         if result and setting.endswith('.bool'):
             result = result in ("true", "1")
@@ -94,6 +155,10 @@ def settings(setting, value=None):
         return result
 
 
+def invalidate_settings():
+    SETTINGS.invalidate()
+
+
 def create_id():
     return uuid4()
 
@@ -173,21 +238,68 @@ def dialog(dialog_type, *args, **kwargs):
     return types[dialog_type](*args, **kwargs)
 
 
-def should_stop():
+class StopToken(object):
 
-    ''' Checkpoint during the sync process.
+    ''' Whether the sync should stop. The service flips it as the events come in,
+        the sync reads the attributes. Kodi is only asked again, for an abort or the
+        window properties set by another entrypoint, every 250ms at most.
     '''
-    if xbmc.Monitor().waitForAbort(0.00001):
-        return True
+    interval = 0.25
 
-    if window('jellyfin_should_stop.bool'):
-        LOG.info("exiiiiitttinggg")
-        return True
+    def __init__(self):
 
-    if not window('jellyfin_online.bool'):
-        return True
+        self.stopping = False
+        self.online = False
+        self.checked = 0
+
+    def poll(self):
+
+        now = time.time()
+
+        if now - self.checked > self.interval:
+
+            self.checked = now
+            self.stopping = xbmc.Monitor().abortRequested() or window('jellyfin_should_stop.bool')
+            self.online = window('jellyfin_online.bool')
+
+    def stop(self):
+
+        window('jellyfin_should_stop.bool', True)
+        self.stopping = True
+        self.checked = time.time()
+
+    def resume(self):
+
+        window('jellyfin_should_stop', clear=True)
+        self.stopping = False
+        self.checked = time.time()
+
+    def set_online(self, online):
+
+        if online:
+            window('jellyfin_online.bool', True)
+        else:
+            window('jellyfin_online', clear=True)
+
+        self.online = online
+        self.checked = time.time()
+
+    def is_stopping(self):
+
+        self.poll()
 
-    return False
+        return self.stopping
+
+    def is_cancelled(self):
+
+        ''' Checkpoint during the sync process.
+        '''
+        self.poll()
+
+        return self.stopping or not self.online
+
+
+STOP = StopToken()
 
 
 def get_screensaver():
@@ -300,6 +412,20 @@ def values(item, keys):
     return (item[key.replace('{', "").replace('}', "")] if isinstance(key, text_type) and key.startswith('{') else key for key in keys)
 
 
+def fingerprint(item, obj, library=None, *args):
+
+    ''' Identify the content written to kodi for an item: the server Etag followed by
+        a hash of what it is written from, the mapped item (userdata included) along
+        with the library and the sync settings in args. Known before any request or
+        write. Only the Id and Name of the library are used, the library dict is not
+        the same for a full sync and for the workers.
+    '''
+    library = [library.get('Id'), library.get('Name')] if library else None
+    mapped = json.dumps([obj, library] + list(args), sort_keys=True, default=text_type)
+
+    return "%s:%s" % (item.get('Etag'), hashlib.sha1(mapped.encode('utf-8')).hexdigest())
+
+
 def delete_folder(path):
 
     ''' Delete objects from kodi cache
@@ -487,6 +613,49 @@ def convert_to_local(date):
         return str(date)
 
 
+def convert_to_kodi_date(date):
+
+    ''' Convert a server date to the local time, formatted for the kodi database.
+        The timestamps of the server are parsed directly and shifted by the offset of
+        the local timezone, looked up once per day. Anything else goes through
+        convert_to_local.
+    '''
+    match = ISO_DATE.match(date) if isinstance(date, string_types) else None
+
+    if match is not None:
+        try:
+            utc = datetime.datetime(*[int(x) for x in match.groups()])
+            local = utc + get_local_offset(utc)
+        except (ValueError, OverflowError):
+            pass
+        else:
+            if local.year >= 1900:
+                return "%04d-%02d-%02d %02d:%02d:%02d" % (local.year, local.month, local.day,
+                                                          local.hour, local.minute, local.second)
+
+    return convert_to_local(date).split('.')[0].replace('T', " ")
+
+
+def get_local_offset(utc):
+
+    ''' Offset of the local timezone at the naive utc datetime. Days with a daylight
+        saving change are not cached.
+    '''
+    day = utc.date()
+
+    if day not in LOCAL_OFFSETS:
+
+        start = datetime.datetime(day.year, day.month, day.day, tzinfo=TZ_UTC)
+        first = start.astimezone(TZ_LOCAL).utcoffset()
+        last = (start + datetime.timedelta(days=1)).astimezone(TZ_LOCAL).utcoffset()
+        LOCAL_OFFSETS[day] = first if first == last else None
+
+    if LOCAL_OFFSETS[day] is None:
+        return utc.replace(tzinfo=TZ_UTC).astimezone(TZ_LOCAL).utcoffset()
+
+    return LOCAL_OFFSETS[day]
+
+
 def has_attribute(obj, name):
     try:
         object.__getattribute__(obj, name)
@@ -538,14 +707,58 @@ def get_filesystem_encoding():
     return enc
 
 
-def find_library(server, item):
-    from database import get_sync
+def find_library(server, item, db):
+
+    ''' Find the whitelisted library an item belongs to.
+        db is the JellyfinDatabase of the calling worker.
+
+        Resolve locally first: the item, its series or its parent folder may already
+        be known to the jellyfin database. Only unknown parents require the ancestors
+        request, and its result is recorded so siblings resolve locally afterwards.
+        Without server nothing is requested and None is returned for an unknown parent.
+
+        A local match returns the Id and Name of the view, the ancestors request the
+        library folder itself. The writers only read Id and Name.
+    '''
+    from database import get_whitelist
+
+    whitelist = get_whitelist()
+
+    def view(library_id):
+        return {'Id': library_id, 'Name': db.get_view_name(library_id)}
 
-    sync = get_sync()
+    if item.get('ParentId') in whitelist:
+        return view(item['ParentId'])
+
+    for key in ('Id', 'SeriesId', 'AlbumId', 'ParentId'):
+        item_id = item.get(key)
+
+        if not item_id:
+            continue
+
+        library_id = db.get_library_index(item_id)
+
+        if library_id is None:
+            e_item = db.get_item_by_id(item_id)
+            library_id = e_item[6] if e_item else None
+
+        if library_id in whitelist:
+            return view(library_id)
+
+    if item.get('ParentId'):
+        library_id = db.get_media_folder_by_parent_id(item['ParentId'])
+
+        if library_id in whitelist:
+            return view(library_id)
+
+    if server is None:
+        return None
 
     ancestors = server.jellyfin.get_ancestors(item['Id'])
-    for ancestor in ancestors:
-        if ancestor['Id'] in sync['Whitelist']:
+    for index, ancestor in enumerate(ancestors):
+        if ancestor['Id'] in whitelist:
+            db.add_library_index(ancestor['Id'], [x['Id'] for x in ancestors[:index]])
+
             return ancestor
 
     LOG.error('No ancestor found, not syncing item with ID: {}'.format(item['Id']))
@@ -7,7 +7,7 @@ from kodi_six import xbmcgui
 
 from helper import LazyLogger
 
-from .utils import should_stop
+from .utils import STOP
 from .exceptions import LibraryException
 from .translate import translate
 
@@ -49,17 +49,11 @@ def progress(message=None):
 
 def stop(func):
 
-    ''' Wrapper to catch exceptions and return using catch
+    ''' Raise StopCalled instead of running func once the sync was told to stop.
     '''
     def wrapper(*args, **kwargs):
 
-        try:
-            if should_stop():  # ??? TODO: Fixme
-                raise Exception
-
-        except Exception as error:
-            LOG.exception(error)
-
+        if STOP.is_cancelled():
             raise LibraryException("StopCalled")
 
         return func(*args, **kwargs)
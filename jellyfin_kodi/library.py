@@ -11,11 +11,12 @@ from six.moves import queue as Queue
 from kodi_six import xbmc, xbmcgui
 
 from objects import Movies, TVShows, MusicVideos, Music
-from database import Database, jellyfin_db, get_sync, save_sync
+from database import Database, jellyfin_db, migrations, get_sync, update_sync
 from full_sync import FullSync
 from views import Views
+import downloader as server
 from downloader import GetItemWorker
-from helper import translate, api, stop, settings, window, dialog, event
+from helper import translate, api, stop, settings, window, dialog, event, STOP
 from helper.utils import split_list, set_screensaver, get_screensaver, find_library
 from helper.exceptions import LibraryException
 from jellyfin import Jellyfin
@@ -26,6 +27,13 @@ from helper import LazyLogger
 LOG = LazyLogger(__name__)
 LIMIT = int(settings('limitIndex') or 15)
 DTHREADS = int(settings('limitThreads') or 3)
+MEDIA = {
+    'movies': "Movie",
+    'tvshows': "Series,Season,Episode",
+    'musicvideos': "MusicVideo",
+    'music': "MusicAlbum,Audio",
+    'mixed': "Movie,Series,Season,Episode"
+}
 
 ##################################################################################################
 
@@ -36,6 +44,7 @@ class Library(threading.Thread):
     stop_thread = False
     suspend = False
     pending_refresh = False
+    pending_reconcile = False
     screensaver = None
     progress_updates = None
     total_updates = 0
@@ -106,9 +115,11 @@ class Library(threading.Thread):
     def test_databases(self):
 
         ''' Open the databases to test if the file exists.
+            Apply the pending migrations of the kodi music database.
         '''
-        with Database('video'), Database('music'):
-            pass
+        with Database('video'), Database('music') as musicdb, Database('jellyfin') as jellyfindb:
+
+            migrations.migrate(musicdb.cursor, 'music', migrations.MUSIC, jellyfindb.cursor)
 
     @stop
     def service(self):
@@ -117,6 +128,11 @@ class Library(threading.Thread):
             Start new "daemon threads" to process library updates.
             (actual daemon thread is not supported in Kodi)
         '''
+        if self.pending_reconcile:
+
+            self.pending_reconcile = False
+            self.reconcile()
+
         self.download_threads = [thread for thread in self.download_threads if not thread.is_done]
         self.writer_threads['updated'] = [thread for thread in self.writer_threads['updated'] if not thread.is_done]
         self.writer_threads['userdata'] = [thread for thread in self.writer_threads['userdata'] if not thread.is_done]
@@ -328,19 +344,15 @@ class Library(threading.Thread):
                 return True
 
             if settings('SyncInstallRunDone.bool'):
-                if settings('kodiCompanion.bool'):
-
-                    if self.server.jellyfin.check_companion_installed():
+                if settings('kodiCompanion.bool') and not self.server.jellyfin.check_companion_installed():
+                    raise LibraryException('CompanionMissing')
 
-                        if not self.fast_sync():
-                            dialog("ok", "{jellyfin}", translate(33128))
+                if not self.fast_sync():
+                    dialog("ok", "{jellyfin}", translate(33128))
 
-                            raise Exception("Failed to retrieve latest updates")
+                    raise Exception("Failed to retrieve latest updates")
 
-                        LOG.info("--<[ retrieve changes ]")
-
-                    else:
-                        raise LibraryException('CompanionMissing')
+                LOG.info("--<[ retrieve changes ]")
 
             return True
         except LibraryException as error:
@@ -350,9 +362,7 @@ class Library(threading.Thread):
 
                 dialog("ok", "{jellyfin}", translate(33129))
                 settings('SyncInstallRunDone.bool', True)
-                sync = get_sync()
-                sync['Libraries'] = []
-                save_sync(sync)
+                update_sync(Libraries=[])
 
                 return True
 
@@ -360,6 +370,7 @@ class Library(threading.Thread):
 
                 dialog("ok", "{jellyfin}", translate(33099))
                 settings('kodiCompanion.bool', False)
+                self.incremental_sync()
 
                 return True
 
@@ -372,6 +383,9 @@ class Library(threading.Thread):
 
         ''' Movie and userdata not provided by server yet.
         '''
+        if not settings('kodiCompanion.bool'):
+            return self.incremental_sync()
+
         last_sync = settings('LastIncrementalSync')
         include = []
         filters = ["tvshows", "boxsets", "musicvideos", "music", "movies"]
@@ -431,6 +445,169 @@ class Library(threading.Thread):
 
         return True
 
+    def incremental_sync(self):
+
+        ''' Retrieve the changes since the last sync without the server plugin.
+            Query each synced library for the items saved since then, and for the items
+            of which only the userdata was saved. The results already contain the full
+            items, they go straight to the writer queues. Removed items are not reported.
+        '''
+        last_sync = settings('LastIncrementalSync')
+        LOG.info("--[ retrieve changes/incremental ] %s", last_sync)
+
+        if not last_sync:
+            return True
+
+        queries = self.get_sync_queries()
+        updated = {}
+        userdata = {}
+
+        try:
+            for library_id, media in queries:
+
+                for items in server.get_items_modified(library_id, last_sync, media):
+                    for item in items['Items']:
+                        updated[item['Id']] = item
+
+                for items in server.get_items_modified(library_id, last_sync, media, True):
+                    for item in items['Items']:
+                        if item['Id'] not in updated:
+                            userdata[item['Id']] = item
+
+        except Exception as error:
+            LOG.exception(error)
+
+            return False
+
+        total = len(updated) + len(userdata)
+
+        if total > int(settings('syncIndicator') or 99):
+
+            ''' Inverse yes no, in case the dialog is forced closed by Kodi.
+            '''
+            if dialog("yesno", "{jellyfin}", translate(33172).replace('{number}', str(total)), nolabel=translate(107), yeslabel=translate(106)):
+                LOG.warning("Large updates skipped.")
+
+                return True
+
+        for output, items in ((self.updated_output, updated), (self.userdata_output, userdata)):
+            for item in items.values():
+
+                if item['Type'] in output:
+                    output[item['Type']].put(item)
+
+        self.total_updates += total
+        LOG.info("---[ updated:%s userdata:%s ]", len(updated), len(userdata))
+
+        return True
+
+    def get_sync_queries(self, skipped=None):
+
+        ''' The (library id, item types) to query for the synced libraries.
+            Boxsets do not belong to a library and are queried without parent.
+            The whitelisted libraries that cannot be queried are added to skipped.
+        '''
+        queries = []
+
+        with Database('jellyfin') as jellyfindb:
+            db = jellyfin_db.JellyfinDatabase(jellyfindb.cursor)
+
+            for library_id in get_sync()['Whitelist']:
+                library_id = library_id.replace('Mixed:', "")
+                library = db.get_view(library_id)
+
+                if library and library[1] in MEDIA:
+                    queries.append((library_id, MEDIA[library[1]]))
+                elif skipped is not None:
+                    skipped.append(library_id)
+
+        if [x for x in queries if x[1] in (MEDIA['movies'], MEDIA['mixed'])]:
+            queries.append((None, "BoxSet"))
+
+        return queries
+
+    def request_reconcile(self):
+
+        ''' Run reconcile on the library thread, the listing takes a while.
+        '''
+        self.pending_reconcile = True
+
+    def reconcile(self):
+
+        ''' Compare the Id and Etag of the items in the synced libraries to the jellyfin
+            database. Queue the new and changed items for update and the items no longer
+            on the server for removal. An item is changed when the Etag of its fingerprint
+            differs, items synced before fingerprints existed are left alone.
+
+            Seasons are synced through Shows/{Id}/Seasons, which keeps the missing ones.
+            They are listed the same way to tell which were removed, but only the ones
+            matching the library query are added.
+
+            The synced items are not stored per library, so reconcile is aborted when a
+            whitelisted library cannot be listed, its items would all look removed.
+            Shows and seasons store no fingerprint, they are added and removed here but
+            their changes are left to the incremental sync.
+        '''
+        LOG.info("--[ reconcile ]")
+        skipped = []
+        queries = self.get_sync_queries(skipped)
+
+        if skipped:
+            LOG.warning("Libraries %s cannot be listed, reconcile aborted", skipped)
+
+            return False
+        manifest = {}
+        listed = set()
+
+        try:
+            for library_id, media in queries:
+                types = media.split(',')
+                manifests = [(",".join(x for x in types if x != 'Season'), False)]
+
+                if 'Season' in types:
+                    manifests.append(("Season", True))
+
+                for item_types, unfiltered in manifests:
+                    received = 0
+                    total = None
+
+                    for items in server.get_manifest(library_id, item_types, unfiltered):
+
+                        total = items['TotalRecordCount']
+                        received += len(items['Items'])
+
+                        for item in items['Items']:
+                            listed.add(item['Id'])
+
+                            if not unfiltered or item.get('LocationType') != "Virtual":
+                                manifest[item['Id']] = "%s" % item.get('Etag')
+
+                    if total is None or received < total:
+                        LOG.warning("Incomplete listing for %s: %s/%s, reconcile aborted", library_id, received, total)
+
+                        return False
+
+        except Exception as error:
+            LOG.exception(error)
+
+            return False
+
+        types = set(x for query in queries for x in query[1].split(','))
+
+        with Database('jellyfin') as jellyfindb:
+            synced = [x for x in jellyfin_db.JellyfinDatabase(jellyfindb.cursor).get_fingerprints() if x[1] in types]
+
+        synced_ids = set(x[0] for x in synced)
+        added = set(manifest) - synced_ids
+        removed = synced_ids - listed
+        changed = set(x[0] for x in synced if x[2] and x[0] in manifest and x[2].split(':', 1)[0] != manifest[x[0]])
+
+        LOG.info("--[ reconcile ] added:%s changed:%s removed:%s", len(added), len(changed), len(removed))
+        self.updated(list(added | changed))
+        self.removed(list(removed))
+
+        return True
+
     def save_last_sync(self):
 
         try:
@@ -581,6 +758,98 @@ class Library(threading.Thread):
         LOG.info("---[ removed:%s ]", len(data))
 
 
+def get_batches(queue):
+
+    ''' Items of a worker queue, grouped by the transaction they are written in.
+        By default a single group drains the queue, waiting for the next item while
+        the databases are locked. With dbBatchWrites, groups of up to LIMIT items are
+        collected first and each is committed on its own, so Kodi gets the database
+        back between groups. Only the libraries are looked up beforehand, the
+        requests an item makes while being written (trailers, seasons) still run
+        inside the transaction.
+
+        There is no staging database merged into Kodi's with INSERT ... SELECT: the
+        writers read back what they just wrote (allocated ids, lookup rows, existing
+        entries), which a detached copy of the tables cannot answer.
+    '''
+    if not settings('dbBatchWrites.bool'):
+        yield drain(queue)
+
+        return
+
+    while True:
+        batch = []
+
+        try:
+            batch.append(queue.get(timeout=1))
+
+            while len(batch) < LIMIT:
+                batch.append(queue.get_nowait())
+        except Queue.Empty:
+            pass
+
+        if not batch:
+            return
+
+        yield batch
+
+
+def drain(queue):
+
+    while True:
+        try:
+            yield queue.get(timeout=1)
+        except Queue.Empty:
+            return
+
+
+def requeue(queue, items):
+
+    ''' Put back the items taken off the queue that were not written, the next
+        worker picks them up.
+    '''
+    for item in items:
+
+        queue.put(item)
+        queue.task_done()
+
+
+def find_libraries(server, items):
+
+    ''' {item id: library} of a batch, looked up before the kodi database is locked
+        as an unknown parent costs a request to the server. Nothing for the single
+        group, its items are only known while it is being written.
+
+        The items are resolved locally first. The server has no ancestors query for
+        several items, so one request is sent per unknown parent of the batch and
+        its siblings share the result.
+    '''
+    if not isinstance(items, list):
+        return {}
+
+    libraries = {}
+    unknown = {}
+
+    with Database('jellyfin') as jellyfindb:
+        database = jellyfin_db.JellyfinDatabase(jellyfindb.cursor)
+
+        for item in items:
+            library = find_library(None, item, database)
+
+            if library is None:
+                unknown.setdefault(item.get('ParentId') or item['Id'], []).append(item)
+            else:
+                libraries[item['Id']] = library
+
+        for siblings in unknown.values():
+            library = find_library(server, siblings[0], database)
+
+            for item in siblings:
+                libraries[item['Id']] = library
+
+    return libraries
+
+
 class UpdateWorker(threading.Thread):
 
     is_done = False
@@ -597,52 +866,73 @@ class UpdateWorker(threading.Thread):
         threading.Thread.__init__(self)
 
     def run(self):
-        with self.lock, self.database as kodidb, Database('jellyfin') as jellyfindb:
-            while True:
 
-                try:
-                    item = self.queue.get(timeout=1)
-                except Queue.Empty:
-                    break
+        stopped = False
+        context = api.SyncContext.create(self.server)
 
-                # Verify that the updated item is in our local whitelist
-                library = find_library(self.server, item)
-                if library:
-                    default_args = (self.server, jellyfindb, kodidb, self.direct_path, library)
-                    try:
-                        if item['Type'] == 'Movie':
-                            Movies(*default_args).movie(item)
-                        elif item['Type'] == 'BoxSet':
-                            Movies(*default_args).boxset(item)
-                        elif item['Type'] == 'Series':
-                            TVShows(*default_args).tvshow(item)
-                        elif item['Type'] == 'Season':
-                            TVShows(*default_args).season(item)
-                        elif item['Type'] == 'Episode':
-                            TVShows(*default_args).episode(item)
-                        elif item['Type'] == 'MusicVideo':
-                            MusicVideos(*default_args).musicvideo(item)
-                        elif item['Type'] == 'MusicAlbum':
-                            Music(*default_args).album(item)
-                        elif item['Type'] == 'MusicArtist':
-                            Music(*default_args).artist(item)
-                        elif item['Type'] == 'AlbumArtist':
-                            Music(*default_args).albumartist(item)
-                        elif item['Type'] == 'Audio':
-                            Music(*default_args).song(item)
-
-                        if self.notify:
-                            self.notify_output.put((item['Type'], api.API(item).get_naming()))
-                    except LibraryException as error:
-                        if error.status == 'StopCalled':
-                            break
-                    except Exception as error:
-                        LOG.exception(error)
+        for items in get_batches(self.queue):
+            libraries = find_libraries(self.server, items)
+            pending = iter(items)
 
-                self.queue.task_done()
+            with self.lock, self.database as kodidb, Database('jellyfin') as jellyfindb:
+                database = jellyfin_db.JellyfinDatabase(jellyfindb.cursor)
 
-                if window('jellyfin_should_stop.bool'):
-                    break
+                for item in pending:
+
+                    # Verify that the updated item is in our local whitelist
+                    if item['Id'] in libraries:
+                        library = libraries[item['Id']]
+                    else:
+                        library = find_library(self.server, item, database)
+
+                    if library:
+                        default_args = (self.server, jellyfindb, kodidb, self.direct_path, library)
+                        try:
+                            if item['Type'] == 'Movie':
+                                Movies(*default_args, context=context).movie(item)
+                            elif item['Type'] == 'BoxSet':
+                                Movies(*default_args, context=context).boxset(item)
+                            elif item['Type'] == 'Series':
+                                TVShows(*default_args, context=context).tvshow(item)
+                            elif item['Type'] == 'Season':
+                                TVShows(*default_args, context=context).season(item)
+                            elif item['Type'] == 'Episode':
+                                TVShows(*default_args, context=context).episode(item)
+                            elif item['Type'] == 'MusicVideo':
+                                MusicVideos(*default_args, context=context).musicvideo(item)
+                            elif item['Type'] == 'MusicAlbum':
+                                Music(*default_args, context=context).album(item)
+                            elif item['Type'] == 'MusicArtist':
+                                Music(*default_args, context=context).artist(item)
+                            elif item['Type'] == 'AlbumArtist':
+                                Music(*default_args, context=context).albumartist(item)
+                            elif item['Type'] == 'Audio':
+                                Music(*default_args, context=context).song(item)
+
+                            if self.notify:
+                                self.notify_output.put((item['Type'], api.API(item).get_naming()))
+                        except LibraryException as error:
+                            if error.status == 'StopCalled':
+
+                                stopped = True
+                                requeue(self.queue, [item])
+
+                                break
+                        except Exception as error:
+                            LOG.exception(error)
+
+                    self.queue.task_done()
+
+                    if STOP.is_stopping():
+                        stopped = True
+                        break
+
+            if stopped:
+
+                if isinstance(items, list):
+                    requeue(self.queue, list(pending))
+
+                break
 
         LOG.info("--<[ q:updated/%s ]", id(self))
         self.is_done = True
@@ -664,41 +954,61 @@ class UserDataWorker(threading.Thread):
 
     def run(self):
 
-        with self.lock, self.database as kodidb, Database('jellyfin') as jellyfindb:
-            while True:
+        stopped = False
+        context = api.SyncContext.create(self.server)
 
-                try:
-                    item = self.queue.get(timeout=1)
-                except Queue.Empty:
-                    break
+        for items in get_batches(self.queue):
+            libraries = find_libraries(self.server, items)
+            pending = iter(items)
 
-                # Verify that the updated item is in our local whitelist
-                library = find_library(self.server, item)
-                if library:
-                    default_args = (self.server, jellyfindb, kodidb, self.direct_path, library)
-                    try:
-                        if item['Type'] == 'Movie':
-                            Movies(*default_args).userdata(item)
-                        elif item['Type'] in ['Series', 'Season', 'Episode']:
-                            TVShows(*default_args).userdata(item)
-                        elif item['Type'] == 'MusicAlbum':
-                            Music(*default_args).album(item)
-                        elif item['Type'] == 'MusicArtist':
-                            Music(*default_args).artist(item)
-                        elif item['Type'] == 'AlbumArtist':
-                            Music(*default_args).albumartist(item)
-                        elif item['Type'] == 'Audio':
-                            Music(*default_args).song(item)
-                    except LibraryException as error:
-                        if error.status == 'StopCalled':
-                            break
-                    except Exception as error:
-                        LOG.exception(error)
+            with self.lock, self.database as kodidb, Database('jellyfin') as jellyfindb:
+                database = jellyfin_db.JellyfinDatabase(jellyfindb.cursor)
 
-                self.queue.task_done()
+                for item in pending:
 
-                if window('jellyfin_should_stop.bool'):
-                    break
+                    # Verify that the updated item is in our local whitelist
+                    if item['Id'] in libraries:
+                        library = libraries[item['Id']]
+                    else:
+                        library = find_library(self.server, item, database)
+
+                    if library:
+                        default_args = (self.server, jellyfindb, kodidb, self.direct_path, library)
+                        try:
+                            if item['Type'] == 'Movie':
+                                Movies(*default_args, context=context).userdata(item)
+                            elif item['Type'] in ['Series', 'Season', 'Episode']:
+                                TVShows(*default_args, context=context).userdata(item)
+                            elif item['Type'] == 'MusicAlbum':
+                                Music(*default_args, context=context).album(item)
+                            elif item['Type'] == 'MusicArtist':
+                                Music(*default_args, context=context).artist(item)
+                            elif item['Type'] == 'AlbumArtist':
+                                Music(*default_args, context=context).albumartist(item)
+                            elif item['Type'] == 'Audio':
+                                Music(*default_args, context=context).song(item)
+                        except LibraryException as error:
+                            if error.status == 'StopCalled':
+
+                                stopped = True
+                                requeue(self.queue, [item])
+
+                                break
+                        except Exception as error:
+                            LOG.exception(error)
+
+                    self.queue.task_done()
+
+                    if STOP.is_stopping():
+                        stopped = True
+                        break
+
+            if stopped:
+
+                if isinstance(items, list):
+                    requeue(self.queue, list(pending))
+
+                break
 
         LOG.info("--<[ q:userdata/%s ]", id(self))
         self.is_done = True
@@ -744,7 +1054,7 @@ class SortWorker(threading.Thread):
 
                 self.queue.task_done()
 
-                if window('jellyfin_should_stop.bool'):
+                if STOP.is_stopping():
                     break
 
         LOG.info("--<[ q:sort/%s ]", id(self))
@@ -765,7 +1075,11 @@ class RemovedWorker(threading.Thread):
 
     def run(self):
 
+        context = api.SyncContext.create(self.args[0])
+
         with self.lock, self.database as kodidb, Database('jellyfin') as jellyfindb:
+            default_args = (self.args[0], jellyfindb, kodidb, self.args[1])
+
             while True:
 
                 try:
@@ -774,13 +1088,13 @@ class RemovedWorker(threading.Thread):
                     break
 
                 if item['Type'] == 'Movie':
-                    obj = Movies(self.args[0], jellyfindb, kodidb, self.args[1]).remove
+                    obj = Movies(*default_args, context=context).remove
                 elif item['Type'] in ['Series', 'Season', 'Episode']:
-                    obj = TVShows(self.args[0], jellyfindb, kodidb, self.args[1]).remove
+                    obj = TVShows(*default_args, context=context).remove
                 elif item['Type'] in ['MusicAlbum', 'MusicArtist', 'AlbumArtist', 'Audio']:
-                    obj = Music(self.args[0], jellyfindb, kodidb, self.args[1]).remove
+                    obj = Music(*default_args, context=context).remove
                 elif item['Type'] == 'MusicVideo':
-                    obj = MusicVideos(self.args[0], jellyfindb, kodidb, self.args[1]).remove
+                    obj = MusicVideos(*default_args, context=context).remove
 
                 try:
                     obj(item['Id'])
@@ -792,7 +1106,7 @@ class RemovedWorker(threading.Thread):
 
                 self.queue.task_done()
 
-                if window('jellyfin_should_stop.bool'):
+                if STOP.is_stopping():
                     break
 
         LOG.info("--<[ q:removed/%s ]", id(self))
@@ -828,7 +1142,7 @@ class NotifyWorker(threading.Thread):
 
             self.queue.task_done()
 
-            if window('jellyfin_should_stop.bool'):
+            if STOP.is_stopping():
                 break
 
         LOG.info("--<[ q:notify/%s ]", id(self))
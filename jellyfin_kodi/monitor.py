@@ -14,6 +14,7 @@ import downloader
 import player
 from client import get_device_id
 from objects import PlaylistWorker, on_play, on_update, special_listener
+from objects.kodi import reset_people, reset_lookups
 from helper import translate, settings, window, dialog, api, JSONRPC
 from helper.utils import JsonDebugPrinter
 from jellyfin import Jellyfin
@@ -48,6 +49,12 @@ class Monitor(xbmc.Monitor):
     def onScanFinished(self, library):
         LOG.info("--<[ kodi scan/%s ]", library)
 
+    def onCleanFinished(self, library):
+
+        LOG.info("--<[ kodi clean/%s ]", library)
+        reset_people()
+        reset_lookups()
+
     def onNotification(self, sender, method, data):
 
         if sender.lower() not in ('plugin.video.jellyfin', 'xbmc', 'upnextprovider.signal'):
@@ -1,6 +1,9 @@
 from __future__ import division, absolute_import, print_function, unicode_literals
 
 from .kodi import Kodi
+from .kodi import reset_people
+from .kodi import reset_lookups
+from .kodi import reset_entry_ids
 from .movies import Movies
 from .musicvideos import MusicVideos
 from .tvshows import TVShows
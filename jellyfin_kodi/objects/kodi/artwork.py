@@ -4,6 +4,7 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 #################################################################################################
 
 from helper import LazyLogger
+from helper.utils import split_list
 
 from . import queries as QU
 
@@ -22,27 +23,14 @@ class Artwork(object):
 
     def update(self, image_url, kodi_id, media, image):
 
-        ''' Update artwork in the video database.
-            Delete current entry before updating with the new one.
+        ''' Update a single artwork in the video database.
         '''
-        if not image_url or image == 'poster' and media in ('song', 'artist', 'album'):
-            return
+        self.sync(media, {kodi_id: {image: image_url}})
 
-        try:
-            self.cursor.execute(QU.get_art, (kodi_id, media, image,))
-            url = self.cursor.fetchone()[0]
-        except TypeError:
-
-            LOG.debug("ADD to kodi_id %s art: %s", kodi_id, image_url)
-            self.cursor.execute(QU.add_art, (kodi_id, media, image, image_url))
-        else:
-            if url != image_url:
-                LOG.info("UPDATE to kodi_id %s art: %s", kodi_id, image_url)
-                self.cursor.execute(QU.update_art, (image_url, kodi_id, media, image))
-
-    def add(self, artwork, *args):
+    def add(self, artwork, kodi_id, media):
 
         ''' Add all artworks.
+            Backdrops no longer on the server are removed, the main fanart is kept.
         '''
         KODI = {
             'Primary': ['thumb', 'poster'],
@@ -53,31 +41,78 @@ class Artwork(object):
             'Disc': "discart",
             'Backdrop': "fanart"
         }
+        images = {}
 
         for art in KODI:
 
             if art == 'Backdrop':
-                self.cursor.execute(QU.get_backdrops, args + ("fanart%",))
-
-                if len(self.cursor.fetchall()) > len(artwork['Backdrop']):
-                    self.cursor.execute(QU.delete_backdrops, args + ("fanart_",))
-
                 for index, backdrop in enumerate(artwork['Backdrop']):
-
-                    if index:
-                        self.update(*(backdrop,) + args + ("%s%s" % ("fanart", index),))
-                    else:
-                        self.update(*(backdrop,) + args + ("fanart",))
+                    images["%s%s" % ("fanart", index or "")] = backdrop
 
             elif art == 'Primary':
                 for kodi_image in KODI['Primary']:
-                    self.update(*(artwork['Primary'],) + args + (kodi_image,))
+                    images[kodi_image] = artwork['Primary']
 
             elif artwork.get(art):
-                self.update(*(artwork[art],) + args + (KODI[art],))
+                images[KODI[art]] = artwork[art]
+
+        self.sync(media, {kodi_id: images}, lambda image: image[6:].isdigit() and image.startswith('fanart'))
+
+    def sync(self, media, artwork, prune=None):
+
+        ''' Write {kodi_id: {image: url}} of a single media type. The current artwork is
+            read in one query and only the differences are written.
+            Images without url are left alone, existing images for which prune(image)
+            is true and that are not in the new artwork are deleted.
+        '''
+        current = {}
+
+        for kodi_ids in split_list(list(artwork), 500):
+            self.cursor.execute(QU.get_art_by_ids.format(",".join("?" * len(kodi_ids))), [media] + kodi_ids)
+
+            for kodi_id, image, url in self.cursor.fetchall():
+                current.setdefault(kodi_id, {})[image] = url
+
+        add, update, delete = [], [], []
+
+        for kodi_id, images in artwork.items():
+            existing = current.get(kodi_id, {})
+
+            for image, url in images.items():
+
+                if not url or image == 'poster' and media in ('song', 'artist', 'album'):
+                    continue
+
+                if image not in existing:
+
+                    LOG.debug("ADD to kodi_id %s art: %s", kodi_id, url)
+                    add.append((kodi_id, media, image, url))
+
+                elif existing[image] != url:
+
+                    LOG.info("UPDATE to kodi_id %s art: %s", kodi_id, url)
+                    update.append((url, kodi_id, media, image))
+
+            if prune is not None:
+                delete.extend((kodi_id, media, image) for image in existing if image not in images and prune(image))
+
+        if add:
+            self.cursor.executemany(QU.add_art, add)
+
+        if update:
+            self.cursor.executemany(QU.update_art, update)
+
+        if delete:
+            self.cursor.executemany(QU.delete_art_type, delete)
 
     def delete(self, *args):
 
         ''' Delete artwork from kodi database
         '''
         self.cursor.execute(QU.delete_art, args)
+
+    def delete_many(self, items):
+
+        ''' Delete artwork from kodi database for [(kodi_id, media), ...]
+        '''
+        self.cursor.executemany(QU.delete_art, items)
@@ -3,6 +3,8 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 
 ##################################################################################################
 
+import threading
+import weakref
 from sqlite3 import IntegrityError
 
 from helper import values
@@ -14,78 +16,247 @@ from . import queries as QU
 ##################################################################################################
 
 LOG = LazyLogger(__name__)
+ALLOCATED = threading.local()
+LOOKUPS = threading.local()
+LOOKUPS_VERSION = 0
+PEOPLE = {}
+PEOPLE_LOCK = threading.Lock()
 
 ##################################################################################################
 
 
+class Lookups(object):
+
+    ''' Ids of the rows of the kodi lookup tables (genre, studio, tag, country, path)
+        by value. One instance is shared by all the objects using the same cursor, that
+        is one Database context, so every page of a sync reuses what the previous pages
+        looked up. A new context starts from scratch, and every instance does after
+        reset_lookups: Kodi cleaned its library or a transaction was discarded.
+    '''
+    def __init__(self, cursor):
+
+        self.cursor = weakref.proxy(cursor)
+        self.tables = {}
+        self.hits = {}
+        self.misses = {}
+        self.version = LOOKUPS_VERSION
+
+    def get(self, table, key, query, add=None):
+
+        ''' Cached id of key, otherwise run the query. When nothing is found, the entry
+            is created with add(*key), or None is returned if add is None.
+        '''
+        if self.version != LOOKUPS_VERSION:
+
+            self.version = LOOKUPS_VERSION
+            self.tables = {}
+
+        cache = self.tables.setdefault(table, {})
+
+        try:
+            value = cache[key]
+        except KeyError:
+            self.misses[table] = self.misses.get(table, 0) + 1
+        else:
+            self.hits[table] = self.hits.get(table, 0) + 1
+
+            return value
+
+        self.cursor.execute(query, key)
+        result = self.cursor.fetchone()
+
+        if result is not None:
+            value = result[0]
+        elif add is not None:
+            value = add(*key)
+        else:
+            return
+
+        cache[key] = value
+
+        return value
+
+    def forget(self, table, ids):
+
+        ''' Drop the entries pointing to ids, after their rows were changed or removed.
+        '''
+        ids = set(ids)
+        cache = self.tables.get(table)
+
+        if cache:
+            for key in [key for key, value in cache.items() if value in ids]:
+                del cache[key]
+
+    def stats(self):
+
+        ''' {table: (hits, misses)}
+        '''
+        return dict((table, (self.hits.get(table, 0), self.misses.get(table, 0))) for table in set(self.hits) | set(self.misses))
+
+
+def reset_lookups():
+
+    ''' Kodi removed rows when cleaning its library, or changes were rolled back. The
+        lookups of every cursor start over on their next use.
+    '''
+    global LOOKUPS_VERSION
+    LOOKUPS_VERSION += 1
+
+
+def reset_entry_ids():
+
+    ''' The transaction of the thread was committed or rolled back, or its connection
+        closed. The ids handed out by create_entry_id are read from the tables again.
+    '''
+    ALLOCATED.__dict__.clear()
+
+
+def get_people(cursor):
+
+    ''' The people of the database file of cursor. The actor table is only read the
+        first time, then the cache is kept up to date by get_person.
+    '''
+    cursor.execute(QU.get_database_file)
+    db_file = cursor.fetchone()[2]
+
+    with PEOPLE_LOCK:
+        if db_file not in PEOPLE:
+
+            try:
+                cursor.execute(QU.get_all_people)
+            except Exception:
+                # Failed to load the table. Has the table been created?
+                return People([])
+
+            PEOPLE[db_file] = People(cursor.fetchall())
+            LOG.info("[ people/%s ] %s loaded", db_file, len(PEOPLE[db_file]))
+
+        return PEOPLE[db_file]
+
+
+def reset_people():
+
+    ''' Kodi removes the actors no longer linked to anything when cleaning the library,
+        and the actors added by a transaction that is rolled back never existed.
+    '''
+    with PEOPLE_LOCK:
+        PEOPLE.clear()
+
+
+class People(object):
+
+    ''' Actor ids by name, shared by the workers writing to the same database file.
+    '''
+    def __init__(self, rows):
+
+        self.ids = {}
+        self.lock = threading.Lock()
+
+        for name, person_id in rows:
+            if name is not None:
+                self.ids.setdefault(name, person_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, name):
+
+        with self.lock:
+            return self.ids.get(name)
+
+    def add(self, name, person_id):
+
+        with self.lock:
+            self.ids[name] = person_id
+
+
 class Kodi(object):
 
     def __init__(self):
         self.artwork = artwork.Artwork(self.cursor)
+        self.people = get_people(self.cursor)
+
+    @property
+    def lookups(self):
+
+        ''' The lookup cache of the current cursor. It goes away with the cursor.
+        '''
+        if not hasattr(LOOKUPS, 'caches'):
+            LOOKUPS.caches = weakref.WeakKeyDictionary()
 
         try:
-            self.cursor.execute(QU.get_all_people)
-        except Exception:
-            # Failed to load the table. Has the table been created?
-            self._people_cache = {}
+            return LOOKUPS.caches[self.cursor]
+        except KeyError:
+            lookups = LOOKUPS.caches[self.cursor] = Lookups(self.cursor)
+
+            return lookups
+
+    def create_entry_id(self, query):
+
+        ''' Next id for the table of a coalesce(max(id)) query. The max is read once per
+            write transaction, after that ids are handed out from memory since nobody
+            else can insert while the transaction is open. The Database context resets
+            them with reset_entry_ids when the transaction ends, the next call reads the
+            max again as Kodi may have added rows in between.
+        '''
+        conn = id(self.cursor.connection)
+
+        if getattr(ALLOCATED, 'conn', None) != conn:
+
+            ALLOCATED.conn = conn
+            ALLOCATED.ids = {}
+
+        if query in ALLOCATED.ids:
+            ALLOCATED.ids[query] += 1
         else:
-            self._people_cache = dict(self.cursor.fetchall())
+            self.cursor.execute(query)
+            ALLOCATED.ids[query] = self.cursor.fetchone()[0] + 1
 
-    def create_entry_path(self):
-        self.cursor.execute(QU.create_path)
+        return ALLOCATED.ids[query]
 
-        return self.cursor.fetchone()[0] + 1
+    def create_entry_path(self):
+        return self.create_entry_id(QU.create_path)
 
     def create_entry_file(self):
-        self.cursor.execute(QU.create_file)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_file)
 
     def create_entry_genre(self):
-        self.cursor.execute(QU.create_genre)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_genre)
 
     def create_entry_studio(self):
-        self.cursor.execute(QU.create_studio)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_studio)
 
     def create_entry_bookmark(self):
-        self.cursor.execute(QU.create_bookmark)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_bookmark)
 
     def create_entry_tag(self):
-        self.cursor.execute(QU.create_tag)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_tag)
 
     def add_path(self, *args):
-        path_id = self.get_path(*args)
+        return self.lookups.get('path', args, QU.get_path, self._add_path)
 
-        if path_id is None:
+    def _add_path(self, *args):
 
-            path_id = self.create_entry_path()
-            self.cursor.execute(QU.add_path, (path_id,) + args)
+        path_id = self.create_entry_path()
+        self.cursor.execute(QU.add_path, (path_id,) + args)
 
         return path_id
 
     def get_path(self, *args):
-
-        try:
-            self.cursor.execute(QU.get_path, args)
-
-            return self.cursor.fetchone()[0]
-        except TypeError:
-            return
+        return self.lookups.get('path', args, QU.get_path)
 
     def update_path(self, *args):
+        self.lookups.forget('path', args[-1:])
         self.cursor.execute(QU.update_path, args)
 
     def remove_path(self, *args):
+        self.lookups.forget('path', args)
         self.cursor.execute(QU.delete_path, args)
 
+    def remove_paths(self, path_ids):
+        self.lookups.forget('path', path_ids)
+        self.cursor.executemany(QU.delete_path, [(path_id,) for path_id in path_ids])
+
     def add_file(self, filename, path_id):
 
         try:
@@ -126,11 +297,12 @@ class Kodi(object):
                 if "writing" in art:
                     art = "writer"
 
-                self.artwork.update(person['imageurl'], person_id, art, "thumb")
+                thumbnails.setdefault(art, {})[person_id] = {'thumb': person['imageurl']}
 
         cast_order = 1
 
         bulk_updates = {}
+        thumbnails = {}
 
         for person in people:
             person_id = self.get_person(person['Name'])
@@ -158,6 +330,9 @@ class Kodi(object):
         for sql, parameters in bulk_updates.items():
             self.cursor.executemany(sql, parameters)
 
+        for art, images in thumbnails.items():
+            self.artwork.sync(art, images)
+
     def add_person(self, *args):
         self.cursor.execute(QU.add_person, args)
         return self.cursor.lastrowid
@@ -171,22 +346,22 @@ class Kodi(object):
             self.cursor.execute(QU.get_person, args)
             return self.cursor.fetchone()[0]
 
-    def get_person(self, *args):
-        try:
-            return self._people_cache[args]
-        except KeyError:
-            person_id = self._get_person(*args)
-            self._people_cache[args] = person_id
-            return person_id
+    def get_person(self, name):
+        person_id = self.people.get(name)
+
+        if person_id is None:
+
+            person_id = self._get_person(name)
+            self.people.add(name, person_id)
+
+        return person_id
 
     def add_genres(self, genres, *args):
 
         ''' Delete current genres first for clean slate.
         '''
         self.cursor.execute(QU.delete_genres, args)
-
-        for genre in genres:
-            self.cursor.execute(QU.update_genres, (self.get_genre(genre),) + args)
+        self.cursor.executemany(QU.update_genres, [(self.get_genre(genre),) + args for genre in genres])
 
     def add_genre(self, *args):
 
@@ -196,20 +371,11 @@ class Kodi(object):
         return genre_id
 
     def get_genre(self, *args):
-
-        try:
-            self.cursor.execute(QU.get_genre, args)
-
-            return self.cursor.fetchone()[0]
-        except TypeError:
-            return self.add_genre(*args)
+        return self.lookups.get('genre', args, QU.get_genre, self.add_genre)
 
     def add_studios(self, studios, *args):
 
-        for studio in studios:
-
-            studio_id = self.get_studio(studio)
-            self.cursor.execute(QU.update_studios, (studio_id,) + args)
+        self.cursor.executemany(QU.update_studios, [(self.get_studio(studio),) + args for studio in studios])
 
     def add_studio(self, *args):
 
@@ -219,13 +385,7 @@ class Kodi(object):
         return studio_id
 
     def get_studio(self, *args):
-
-        try:
-            self.cursor.execute(QU.get_studio, args)
-
-            return self.cursor.fetchone()[0]
-        except TypeError:
-            return self.add_studio(*args)
+        return self.lookups.get('studio', args, QU.get_studio, self.add_studio)
 
     def add_streams(self, file_id, streams, runtime):
 
@@ -235,28 +395,25 @@ class Kodi(object):
         self.cursor.execute(QU.delete_streams, (file_id,))
 
         if streams:
+            video, audio, subtitle = [], [], []
+
             for track in streams['video']:
 
                 track['FileId'] = file_id
                 track['Runtime'] = runtime
-                self.add_stream_video(*values(track, QU.add_stream_video_obj))
+                video.append(tuple(values(track, QU.add_stream_video_obj)))
 
             for track in streams['audio']:
 
                 track['FileId'] = file_id
-                self.add_stream_audio(*values(track, QU.add_stream_audio_obj))
+                audio.append(tuple(values(track, QU.add_stream_audio_obj)))
 
             for track in streams['subtitle']:
-                self.add_stream_sub(*values({'language': track, 'FileId': file_id}, QU.add_stream_sub_obj))
-
-    def add_stream_video(self, *args):
-        self.cursor.execute(QU.add_stream_video, args)
+                subtitle.append(tuple(values({'language': track, 'FileId': file_id}, QU.add_stream_sub_obj)))
 
-    def add_stream_audio(self, *args):
-        self.cursor.execute(QU.add_stream_audio, args)
-
-    def add_stream_sub(self, *args):
-        self.cursor.execute(QU.add_stream_sub, args)
+            self.cursor.executemany(QU.add_stream_video, video)
+            self.cursor.executemany(QU.add_stream_audio, audio)
+            self.cursor.executemany(QU.add_stream_sub, subtitle)
 
     def add_playstate(self, file_id, playcount, date_played, resume, *args):
 
@@ -276,9 +433,7 @@ class Kodi(object):
 
     def add_tags(self, tags, *args):
         self.cursor.execute(QU.delete_tags, args)
-
-        for tag in tags:
-            self.get_tag(tag, *args)
+        self.cursor.executemany(QU.update_tag, [(self.get_tag_id(tag),) + args for tag in tags])
 
     def add_tag(self, *args):
 
@@ -287,24 +442,21 @@ class Kodi(object):
 
         return tag_id
 
-    def get_tag(self, tag, *args):
+    def get_tag_id(self, tag):
+        return self.lookups.get('tag', (tag,), QU.get_tag, self.add_tag)
 
-        try:
-            self.cursor.execute(QU.get_tag, (tag,))
-            tag_id = self.cursor.fetchone()[0]
-        except TypeError:
-            tag_id = self.add_tag(tag)
+    def get_tag(self, tag, *args):
 
+        tag_id = self.get_tag_id(tag)
         self.cursor.execute(QU.update_tag, (tag_id,) + args)
 
         return tag_id
 
     def remove_tag(self, tag, *args):
 
-        try:
-            self.cursor.execute(QU.get_tag, (tag,))
-            tag_id = self.cursor.fetchone()[0]
-        except TypeError:
+        tag_id = self.lookups.get('tag', (tag,), QU.get_tag)
+
+        if tag_id is None:
             return
 
         self.cursor.execute(QU.delete_tag, (tag_id,) + args)
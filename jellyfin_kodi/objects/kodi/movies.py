@@ -23,19 +23,13 @@ class Movies(Kodi):
         Kodi.__init__(self)
 
     def create_entry_unique_id(self):
-        self.cursor.execute(QU.create_unique_id)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_unique_id)
 
     def create_entry_rating(self):
-        self.cursor.execute(QU.create_rating)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_rating)
 
     def create_entry(self):
-        self.cursor.execute(QU.create_movie)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_movie)
 
     def get(self, *args):
 
@@ -56,6 +50,13 @@ class Movies(Kodi):
         self.cursor.execute(QU.delete_movie, (kodi_id,))
         self.cursor.execute(QU.delete_file, (file_id,))
 
+    def delete_many(self, items):
+
+        ''' items: [(kodi_id, file_id), ...]
+        '''
+        self.cursor.executemany(QU.delete_movie, [(item[0],) for item in items])
+        self.cursor.executemany(QU.delete_file, [(item[1],) for item in items])
+
     def get_rating_id(self, *args):
 
         try:
@@ -100,21 +101,14 @@ class Movies(Kodi):
 
     def add_countries(self, countries, *args):
 
-        for country in countries:
-            self.cursor.execute(QU.update_country, (self.get_country(country),) + args)
+        self.cursor.executemany(QU.update_country, [(self.get_country(country),) + args for country in countries])
 
     def add_country(self, *args):
         self.cursor.execute(QU.add_country, args)
         return self.cursor.lastrowid
 
     def get_country(self, *args):
-
-        try:
-            self.cursor.execute(QU.get_country, args)
-
-            return self.cursor.fetchone()[0]
-        except TypeError:
-            return self.add_country(*args)
+        return self.lookups.get('country', args, QU.get_country, self.add_country)
 
     def add_boxset(self, *args):
         self.cursor.execute(QU.add_set, args)
@@ -29,26 +29,19 @@ class Music(Kodi):
         ''' Krypton has a dummy first entry
             idArtist: 1  strArtist: [Missing Tag]  strMusicBrainzArtistID: Artist Tag Missing
         '''
-        self.cursor.execute(QU.create_artist)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_artist)
 
     def create_entry_album(self):
-        self.cursor.execute(QU.create_album)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_album)
 
     def create_entry_song(self):
-        self.cursor.execute(QU.create_song)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_song)
 
     def create_entry_genre(self):
-        self.cursor.execute(QU.create_genre)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_genre)
 
     def update_path(self, *args):
+        self.lookups.forget('path', args[-1:])
         self.cursor.execute(QU.update_path, args)
 
     def add_role(self, *args):
@@ -90,11 +83,11 @@ class Music(Kodi):
     def update(self, *args):
         self.cursor.execute(QU.update_artist, args)
 
-    def link(self, *args):
-        self.cursor.execute(QU.update_link, args)
+    def links(self, links):
+        self.cursor.executemany(QU.update_link, links)
 
-    def add_discography(self, *args):
-        self.cursor.execute(QU.update_discography, args)
+    def add_discographies(self, discographies):
+        self.cursor.executemany(QU.update_discography, discographies)
 
     def validate_artist(self, *args):
 
@@ -207,8 +200,8 @@ class Music(Kodi):
         else:
             self.cursor.execute(QU.update_song74, args)
 
-    def link_song_artist(self, *args):
-        self.cursor.execute(QU.update_song_artist, args)
+    def link_song_artists(self, links):
+        self.cursor.executemany(QU.update_song_artist, links)
 
     def link_song_album(self, *args):
         if self.version_id < 72:
@@ -224,28 +217,14 @@ class Music(Kodi):
         '''
         if media == 'album' and self.version_id < 72:
             self.cursor.execute(QU.delete_genres_album, (kodi_id,))
-
-            for genre in genres:
-
-                genre_id = self.get_genre(genre)
-                self.cursor.execute(QU.update_genre_album, (genre_id, kodi_id))
+            self.cursor.executemany(QU.update_genre_album, [(self.get_genre(genre), kodi_id) for genre in genres])
 
         if media == 'song':
             self.cursor.execute(QU.delete_genres_song, (kodi_id,))
-
-            for genre in genres:
-
-                genre_id = self.get_genre(genre)
-                self.cursor.execute(QU.update_genre_song, (genre_id, kodi_id))
+            self.cursor.executemany(QU.update_genre_song, [(self.get_genre(genre), kodi_id) for genre in genres])
 
     def get_genre(self, *args):
-
-        try:
-            self.cursor.execute(QU.get_genre, args)
-
-            return self.cursor.fetchone()[0]
-        except TypeError:
-            return self.add_genre(*args)
+        return self.lookups.get('genre', args, QU.get_genre, self.add_genre)
 
     def add_genre(self, *args):
 
@@ -263,6 +242,15 @@ class Music(Kodi):
     def delete_song(self, *args):
         self.cursor.execute(QU.delete_song, args)
 
+    def delete_artists(self, kodi_ids):
+        self.cursor.executemany(QU.delete_artist, [(kodi_id,) for kodi_id in kodi_ids])
+
+    def delete_albums(self, kodi_ids):
+        self.cursor.executemany(QU.delete_album, [(kodi_id,) for kodi_id in kodi_ids])
+
+    def delete_songs(self, kodi_ids):
+        self.cursor.executemany(QU.delete_song, [(kodi_id,) for kodi_id in kodi_ids])
+
     def get_version(self):
         self.cursor.execute(QU.get_version)
 
@@ -23,9 +23,7 @@ class MusicVideos(Kodi):
         Kodi.__init__(self)
 
     def create_entry(self):
-        self.cursor.execute(QU.create_musicvideo)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_musicvideo)
 
     def get(self, *args):
 
@@ -46,3 +44,10 @@ class MusicVideos(Kodi):
 
         self.cursor.execute(QU.delete_musicvideo, (kodi_id,))
         self.cursor.execute(QU.delete_file, (file_id,))
+
+    def delete_many(self, items):
+
+        ''' items: [(kodi_id, file_id), ...]
+        '''
+        self.cursor.executemany(QU.delete_musicvideo, [(item[0],) for item in items])
+        self.cursor.executemany(QU.delete_file, [(item[1],) for item in items])
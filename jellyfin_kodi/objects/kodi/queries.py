@@ -76,6 +76,9 @@ SELECT      strFilename
 FROM        files
 WHERE       idFile = ?
 """
+get_database_file = """
+PRAGMA      database_list
+"""
 get_all_people = """
 SELECT      name, actor_id
 FROM        actor
@@ -176,12 +179,11 @@ AND         season = ?
 get_season_obj = ["{Title}", "{ShowId}", "{Index}"]
 get_season_special_obj = [None, "{ShowId}", -1]
 get_season_episode_obj = [None, "{ShowId}", "{Season}"]
-get_backdrops = """
-SELECT      url
+get_art_by_ids = """
+SELECT      media_id, type, url
 FROM        art
-WHERE       media_id = ?
-AND         media_type = ?
-AND         type LIKE ?
+WHERE       media_type = ?
+AND         media_id IN ({})
 """
 get_art = """
 SELECT      url
@@ -556,9 +558,9 @@ DELETE FROM     art
 WHERE           media_id = ?
 AND             media_type = ?
 """
-delete_backdrops = """
+delete_art_type = """
 DELETE FROM     art
 WHERE           media_id = ?
 AND             media_type = ?
-AND             type LIKE ?
+AND             type = ?
 """
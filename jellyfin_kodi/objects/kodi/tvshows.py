@@ -23,29 +23,19 @@ class TVShows(Kodi):
         Kodi.__init__(self)
 
     def create_entry_unique_id(self):
-        self.cursor.execute(QU.create_unique_id)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_unique_id)
 
     def create_entry_rating(self):
-        self.cursor.execute(QU.create_rating)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_rating)
 
     def create_entry(self):
-        self.cursor.execute(QU.create_tvshow)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_tvshow)
 
     def create_entry_season(self):
-        self.cursor.execute(QU.create_season)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_season)
 
     def create_entry_episode(self):
-        self.cursor.execute(QU.create_episode)
-
-        return self.cursor.fetchone()[0] + 1
+        return self.create_entry_id(QU.create_episode)
 
     def get(self, *args):
 
@@ -154,3 +144,16 @@ class TVShows(Kodi):
 
         self.cursor.execute(QU.delete_episode, (kodi_id,))
         self.cursor.execute(QU.delete_file, (file_id,))
+
+    def delete_tvshows(self, kodi_ids):
+        self.cursor.executemany(QU.delete_tvshow, [(kodi_id,) for kodi_id in kodi_ids])
+
+    def delete_seasons(self, kodi_ids):
+        self.cursor.executemany(QU.delete_season, [(kodi_id,) for kodi_id in kodi_ids])
+
+    def delete_episodes(self, items):
+
+        ''' items: [(kodi_id, file_id), ...]
+        '''
+        self.cursor.executemany(QU.delete_episode, [(item[0],) for item in items])
+        self.cursor.executemany(QU.delete_file, [(item[1],) for item in items])
@@ -8,7 +8,7 @@ from kodi_six.utils import py2_encode
 
 import downloader as server
 from database import jellyfin_db, queries as QUEM
-from helper import api, stop, validate, validate_bluray_dir, validate_dvd_dir, jellyfin_item, values, Local
+from helper import api, stop, validate, validate_bluray_dir, validate_dvd_dir, jellyfin_item, values, fingerprint, KodiDate
 from helper import LazyLogger
 from helper.exceptions import PathValidationException
 
@@ -24,9 +24,10 @@ LOG = LazyLogger(__name__)
 
 class Movies(KodiDb):
 
-    def __init__(self, server, jellyfindb, videodb, direct_path, library=None):
+    def __init__(self, server, jellyfindb, videodb, direct_path, library=None, context=None):
 
         self.server = server
+        self.context = context or api.SyncContext.create(server)
         self.jellyfin = jellyfindb
         self.video = videodb
         self.direct_path = direct_path
@@ -45,9 +46,9 @@ class Movies(KodiDb):
         ''' If item does not exist, entry will be added.
             If item exists, entry will be updated.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'Movie')
+        obj['Fingerprint'] = fingerprint(item, obj, self.library, self.direct_path, self.context)
         update = True
 
         try:
@@ -64,6 +65,12 @@ class Movies(KodiDb):
                 update = False
                 LOG.info("MovieId %s missing from kodi. repairing the entry.", obj['MovieId'])
 
+        if update and e_item[8] == obj['Fingerprint']:
+            LOG.debug("SKIP movie [%s] %s: %s unchanged", obj['MovieId'], obj['Id'], obj['Title'])
+            self.item_ids.append(obj['Id'])
+
+            return False
+
         obj['Path'] = API.get_file_path(obj['Path'])
         obj['LibraryId'] = self.library['Id']
         obj['LibraryName'] = self.library['Name']
@@ -78,8 +85,8 @@ class Movies(KodiDb):
         obj['Resume'] = API.adjust_resume((obj['Resume'] or 0) / 10000000.0)
         obj['Runtime'] = round(float((obj['Runtime'] or 0) / 10000000.0), 6)
         obj['People'] = API.get_people_artwork(obj['People'])
-        obj['DateAdded'] = Local(obj['DateAdded']).split('.')[0].replace('T', " ")
-        obj['DatePlayed'] = None if not obj['DatePlayed'] else Local(obj['DatePlayed']).split('.')[0].replace('T', " ")
+        obj['DateAdded'] = KodiDate(obj['DateAdded'])
+        obj['DatePlayed'] = None if not obj['DatePlayed'] else KodiDate(obj['DatePlayed'])
         obj['PlayCount'] = API.get_playcount(obj['Played'], obj['PlayCount'])
         obj['Artwork'] = API.get_all_artwork(self.objects.map(item, 'Artwork'))
         obj['Video'] = API.video_streams(obj['Video'] or [], obj['Container'])
@@ -116,6 +123,7 @@ class Movies(KodiDb):
         self.add_streams(*values(obj, QU.add_streams_obj))
         self.artwork.add(obj['Artwork'], obj['MovieId'], "movie")
         self.item_ids.append(obj['Id'])
+        self.jellyfin_db.update_fingerprint(*values(obj, QUEM.update_fingerprint_obj))
 
         return not update
 
@@ -210,8 +218,7 @@ class Movies(KodiDb):
             Process movies inside boxset.
             Process removals from boxset.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'Boxset')
 
         obj['Overview'] = API.get_overview(obj['Overview'])
@@ -288,8 +295,7 @@ class Movies(KodiDb):
         ''' This updates: Favorite, LastPlayedDate, Playcount, PlaybackPositionTicks
             Poster with progress bar
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'MovieUserData')
 
         try:
@@ -303,7 +309,7 @@ class Movies(KodiDb):
         obj['PlayCount'] = API.get_playcount(obj['Played'], obj['PlayCount'])
 
         if obj['DatePlayed']:
-            obj['DatePlayed'] = Local(obj['DatePlayed']).split('.')[0].replace('T', " ")
+            obj['DatePlayed'] = KodiDate(obj['DatePlayed'])
 
         if obj['Favorite']:
             self.get_tag(*values(obj, QU.get_tag_movie_obj))
@@ -349,3 +355,17 @@ class Movies(KodiDb):
 
         self.jellyfin_db.remove_item(*values(obj, QUEM.delete_item_obj))
         LOG.debug("DELETE %s [%s/%s] %s", obj['Media'], obj['FileId'], obj['KodiId'], obj['Id'])
+
+    def remove_items(self, item_ids):
+
+        ''' Remove many movies at once, with one statement per table.
+            Boxsets are not handled here, use remove.
+        '''
+        movies = [x for x in self.jellyfin_db.get_items_by_ids(item_ids) if x[5] == 'movie']
+
+        self.artwork.delete_many([(x[1], "movie") for x in movies])
+        self.delete_many([(x[1], x[2]) for x in movies])
+        self.jellyfin_db.remove_items([x[0] for x in movies])
+        LOG.debug("DELETE movies: %s", len(movies))
+
+        return {'movie': len(movies)}
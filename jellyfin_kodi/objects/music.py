@@ -6,7 +6,7 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 import datetime
 
 from database import jellyfin_db, queries as QUEM
-from helper import api, stop, validate, jellyfin_item, values, Local
+from helper import api, stop, validate, jellyfin_item, values, fingerprint, KodiDate
 from helper import LazyLogger
 from helper.exceptions import PathValidationException
 
@@ -22,9 +22,10 @@ LOG = LazyLogger(__name__)
 
 class Music(KodiDb):
 
-    def __init__(self, server, jellyfindb, musicdb, direct_path, library=None):
+    def __init__(self, server, jellyfindb, musicdb, direct_path, library=None, context=None):
 
         self.server = server
+        self.context = context or api.SyncContext.create(server)
         self.jellyfin = jellyfindb
         self.music = musicdb
         self.direct_path = direct_path
@@ -43,8 +44,7 @@ class Music(KodiDb):
         ''' If item does not exist, entry will be added.
             If item exists, entry will be updated.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'Artist')
         update = True
 
@@ -109,8 +109,7 @@ class Music(KodiDb):
 
         ''' Update object to kodi.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'Album')
         update = True
 
@@ -169,6 +168,8 @@ class Music(KodiDb):
 
         ''' Update the artist's discography.
         '''
+        discography = []
+
         for artist in (obj['ArtistItems'] or []):
 
             temp_obj = dict(obj)
@@ -180,14 +181,18 @@ class Music(KodiDb):
             except TypeError:
                 continue
 
-            self.add_discography(*values(temp_obj, QU.update_discography_obj))
+            discography.append(tuple(values(temp_obj, QU.update_discography_obj)))
             self.jellyfin_db.update_parent_id(*values(temp_obj, QUEM.update_parent_album_obj))
 
+        self.add_discographies(discography)
+
     def artist_link(self, obj):
 
         ''' Assign main artists to album.
             Artist does not exist in jellyfin database, create the reference.
         '''
+        links = []
+
         for artist in (obj['AlbumArtists'] or []):
 
             temp_obj = dict(obj)
@@ -206,18 +211,20 @@ class Music(KodiDb):
                     continue
 
             self.update_artist_name(*values(temp_obj, QU.update_artist_name_obj))
-            self.link(*values(temp_obj, QU.update_link_obj))
+            links.append(tuple(values(temp_obj, QU.update_link_obj)))
             self.item_ids.append(temp_obj['Id'])
 
+        self.links(links)
+
     @stop
     @jellyfin_item
     def song(self, item, e_item):
 
         ''' Update object to kodi.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'Song')
+        obj['Fingerprint'] = fingerprint(item, obj, self.library, self.direct_path, self.context)
         update = True
 
         try:
@@ -234,6 +241,12 @@ class Music(KodiDb):
                 update = False
                 LOG.info("SongId %s missing from kodi. repairing the entry.", obj['SongId'])
 
+        if update and e_item[8] == obj['Fingerprint']:
+            LOG.debug("SKIP song [%s] %s: %s unchanged", obj['SongId'], obj['Id'], obj['Title'])
+            self.item_ids.append(obj['Id'])
+
+            return False
+
         self.get_song_path_filename(obj, API)
 
         obj['Rating'] = 0
@@ -250,10 +263,10 @@ class Music(KodiDb):
         obj['Artwork'] = API.get_all_artwork(self.objects.map(item, 'ArtworkMusic'), True)
 
         if obj['DateAdded']:
-            obj['DateAdded'] = Local(obj['DateAdded']).split('.')[0].replace('T', " ")
+            obj['DateAdded'] = KodiDate(obj['DateAdded'])
 
         if obj['DatePlayed']:
-            obj['DatePlayed'] = Local(obj['DatePlayed']).split('.')[0].replace('T', " ")
+            obj['DatePlayed'] = KodiDate(obj['DatePlayed'])
 
         if obj['Disc'] != 1:
             obj['Index'] = obj['Disc'] * 2 ** 16 + obj['Index']
@@ -274,6 +287,7 @@ class Music(KodiDb):
         self.add_genres(*values(obj, QU.update_genre_song_obj))
         self.artwork.add(obj['Artwork'], obj['SongId'], "song")
         self.item_ids.append(obj['Id'])
+        self.jellyfin_db.update_fingerprint(*values(obj, QUEM.update_fingerprint_obj))
 
         if obj['SongAlbumId'] is None:
             self.artwork.add(obj['Artwork'], obj['AlbumId'], "album")
@@ -331,8 +345,7 @@ class Music(KodiDb):
             obj['Path'] = obj['Path'].replace(obj['Filename'], "")
 
         else:
-            server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-            obj['Path'] = "%s/Audio/%s/" % (server_address, obj['Id'])
+            obj['Path'] = "%s/Audio/%s/" % (self.context.server, obj['Id'])
             obj['Filename'] = "stream.%s?static=true" % obj['Container']
 
     def song_artist_discography(self, obj):
@@ -340,6 +353,9 @@ class Music(KodiDb):
         ''' Update the artist's discography.
         '''
         artists = []
+        links = []
+        discography = []
+
         for artist in (obj['AlbumArtists'] or []):
 
             temp_obj = dict(obj)
@@ -359,15 +375,17 @@ class Music(KodiDb):
                     LOG.exception(error)
                     continue
 
-            self.link(*values(temp_obj, QU.update_link_obj))
+            links.append(tuple(values(temp_obj, QU.update_link_obj)))
             self.item_ids.append(temp_obj['Id'])
 
             if obj['Album']:
 
                 temp_obj['Title'] = obj['Album']
                 temp_obj['Year'] = 0
-                self.add_discography(*values(temp_obj, QU.update_discography_obj))
+                discography.append(tuple(values(temp_obj, QU.update_discography_obj)))
 
+        self.links(links)
+        self.add_discographies(discography)
         obj['AlbumArtists'] = artists
 
     def song_artist_link(self, obj):
@@ -375,6 +393,8 @@ class Music(KodiDb):
         ''' Assign main artists to song.
             Artist does not exist in jellyfin database, create the reference.
         '''
+        song_artists = []
+
         for index, artist in enumerate(obj['ArtistItems'] or []):
 
             temp_obj = dict(obj)
@@ -393,9 +413,11 @@ class Music(KodiDb):
                     LOG.exception(error)
                     continue
 
-            self.link_song_artist(*values(temp_obj, QU.update_song_artist_obj))
+            song_artists.append(tuple(values(temp_obj, QU.update_song_artist_obj)))
             self.item_ids.append(temp_obj['Id'])
 
+        self.link_song_artists(song_artists)
+
     def single(self, obj):
 
         obj['AlbumId'] = self.create_entry_album()
@@ -408,8 +430,7 @@ class Music(KodiDb):
         ''' This updates: Favorite, LastPlayedDate, Playcount, PlaybackPositionTicks
             Poster with progress bar
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'SongUserData')
 
         try:
@@ -423,7 +444,7 @@ class Music(KodiDb):
         if obj['Media'] == 'song':
 
             if obj['DatePlayed']:
-                obj['DatePlayed'] = Local(obj['DatePlayed']).split('.')[0].replace('T', " ")
+                obj['DatePlayed'] = KodiDate(obj['DatePlayed'])
 
             self.rate_song(*values(obj, QU.update_song_rating_obj))
 
@@ -493,6 +514,27 @@ class Music(KodiDb):
 
         self.jellyfin_db.remove_item(*values(obj, QUEM.delete_item_obj))
 
+    def remove_items(self, item_ids):
+
+        ''' Remove many artists at once with their albums and songs.
+            One statement per table.
+        '''
+        artists = [x for x in self.jellyfin_db.get_items_by_ids(item_ids) if x[5] == 'artist']
+        albums = self.jellyfin_db.get_items_by_parent_ids([x[1] for x in artists], "album")
+        songs = self.jellyfin_db.get_items_by_parent_ids([x[1] for x in albums], "song")
+        linked = self.jellyfin_db.get_items_by_parent_ids([x[1] for x in albums], "artist")
+
+        self.artwork.delete_many([(x[1], "song") for x in songs])
+        self.artwork.delete_many([(x[1], "album") for x in albums])
+        self.artwork.delete_many([(x[1], "artist") for x in artists])
+        self.delete_songs([x[1] for x in songs])
+        self.delete_albums([x[1] for x in albums])
+        self.delete_artists([x[1] for x in artists])
+        self.jellyfin_db.remove_items(set(x[0] for x in artists + albums + songs + linked))
+        LOG.debug("DELETE artists: %s albums: %s songs: %s", len(artists), len(albums), len(songs))
+
+        return {'artist': len(artists), 'album': len(albums), 'song': len(songs)}
+
     def remove_artist(self, kodi_id, item_id):
 
         self.artwork.delete(kodi_id, "artist")
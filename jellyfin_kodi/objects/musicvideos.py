@@ -10,7 +10,7 @@ from six.moves.urllib.parse import urlencode
 from kodi_six.utils import py2_encode
 
 from database import jellyfin_db, queries as QUEM
-from helper import api, stop, validate, jellyfin_item, values, Local
+from helper import api, stop, validate, jellyfin_item, values, fingerprint, Local, KodiDate
 from helper import LazyLogger
 from helper.exceptions import PathValidationException
 
@@ -26,9 +26,10 @@ LOG = LazyLogger(__name__)
 
 class MusicVideos(KodiDb):
 
-    def __init__(self, server, jellyfindb, videodb, direct_path, library=None):
+    def __init__(self, server, jellyfindb, videodb, direct_path, library=None, context=None):
 
         self.server = server
+        self.context = context or api.SyncContext.create(server)
         self.jellyfin = jellyfindb
         self.video = videodb
         self.direct_path = direct_path
@@ -50,9 +51,9 @@ class MusicVideos(KodiDb):
             If we don't get the track number from Jellyfin, see if we can infer it
             from the sortname attribute.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'MusicVideo')
+        obj['Fingerprint'] = fingerprint(item, obj, self.library, self.direct_path, self.context)
         update = True
 
         try:
@@ -69,6 +70,12 @@ class MusicVideos(KodiDb):
                 update = False
                 LOG.info("MvideoId %s missing from kodi. repairing the entry.", obj['MvideoId'])
 
+        if update and e_item[8] == obj['Fingerprint']:
+            LOG.debug("SKIP musicvideo [%s] %s: %s unchanged", obj['MvideoId'], obj['Id'], obj['Title'])
+            self.item_ids.append(obj['Id'])
+
+            return False
+
         obj['Path'] = API.get_file_path(obj['Path'])
         obj['LibraryId'] = self.library['Id']
         obj['LibraryName'] = self.library['Name']
@@ -76,8 +83,8 @@ class MusicVideos(KodiDb):
         obj['ArtistItems'] = obj['ArtistItems'] or []
         obj['Studios'] = [API.validate_studio(studio) for studio in (obj['Studios'] or [])]
         obj['Plot'] = API.get_overview(obj['Plot'])
-        obj['DateAdded'] = Local(obj['DateAdded']).split('.')[0].replace('T', " ")
-        obj['DatePlayed'] = None if not obj['DatePlayed'] else Local(obj['DatePlayed']).split('.')[0].replace('T', " ")
+        obj['DateAdded'] = KodiDate(obj['DateAdded'])
+        obj['DatePlayed'] = None if not obj['DatePlayed'] else KodiDate(obj['DatePlayed'])
         obj['PlayCount'] = API.get_playcount(obj['Played'], obj['PlayCount'])
         obj['Resume'] = API.adjust_resume((obj['Resume'] or 0) / 10000000.0)
         obj['Runtime'] = round(float((obj['Runtime'] or 0) / 10000000.0), 6)
@@ -132,6 +139,7 @@ class MusicVideos(KodiDb):
         self.add_streams(*values(obj, QU.add_streams_obj))
         self.artwork.add(obj['Artwork'], obj['MvideoId'], "musicvideo")
         self.item_ids.append(obj['Id'])
+        self.jellyfin_db.update_fingerprint(*values(obj, QUEM.update_fingerprint_obj))
 
         return not update
 
@@ -184,8 +192,7 @@ class MusicVideos(KodiDb):
         ''' This updates: Favorite, LastPlayedDate, Playcount, PlaybackPositionTicks
             Poster with progress bar
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'MusicVideoUserData')
 
         try:
@@ -199,7 +206,7 @@ class MusicVideos(KodiDb):
         obj['PlayCount'] = API.get_playcount(obj['Played'], obj['PlayCount'])
 
         if obj['DatePlayed']:
-            obj['DatePlayed'] = Local(obj['DatePlayed']).split('.')[0].replace('T', " ")
+            obj['DatePlayed'] = KodiDate(obj['DatePlayed'])
 
         if obj['Favorite']:
             self.get_tag(*values(obj, QU.get_tag_mvideo_obj))
@@ -233,3 +240,20 @@ class MusicVideos(KodiDb):
 
         self.jellyfin_db.remove_item(*values(obj, QUEM.delete_item_obj))
         LOG.debug("DELETE musicvideo %s [%s/%s] %s", obj['MvideoId'], obj['PathId'], obj['FileId'], obj['Id'])
+
+    def remove_items(self, item_ids):
+
+        ''' Remove many musicvideos at once, with one statement per table.
+        '''
+        mvideos = [x for x in self.jellyfin_db.get_items_by_ids(item_ids) if x[5] == 'musicvideo']
+
+        self.artwork.delete_many([(x[1], "musicvideo") for x in mvideos])
+        self.delete_many([(x[1], x[2]) for x in mvideos])
+
+        if self.direct_path:
+            self.remove_paths([x[3] for x in mvideos])
+
+        self.jellyfin_db.remove_items([x[0] for x in mvideos])
+        LOG.debug("DELETE musicvideos: %s", len(mvideos))
+
+        return {'musicvideo': len(mvideos)}
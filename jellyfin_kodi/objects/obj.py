@@ -13,6 +13,7 @@ from helper import LazyLogger, get_filesystem_encoding
 ##################################################################################################
 
 LOG = LazyLogger(__name__)
+MISSING = object()
 
 ##################################################################################################
 
@@ -31,13 +32,20 @@ class Objects(object):
 
     def mapping(self):
 
-        ''' Load objects mapping.
+        ''' Load objects mapping and compile it.
         '''
         file_dir = os.path.dirname(ensure_text(__file__, get_filesystem_encoding()))
 
         with open(os.path.join(file_dir, 'obj_map.json')) as infile:
             self.objects = json.load(infile)
 
+        self.compiled = {}
+
+        for mapping_name, mapping in iteritems(self.objects):
+            if isinstance(mapping, dict):
+                self.compiled[mapping_name] = [(key, [compile_query(query) for query in value.split(',')])
+                                               for key, value in iteritems(mapping)]
+
     def map(self, item, mapping_name):
 
         ''' Syntax to traverse the item dictionary.
@@ -51,114 +59,143 @@ class Objects(object):
             ":": indicates it's a list of elements [], i.e. MediaSources/0/MediaStreams:?$Name
                  MediaStreams is a list.
             "/": indicates where to go directly
-        '''
-        self.mapped_item = {}
 
+            The queries are compiled by mapping(), this only runs them.
+        '''
         if not mapping_name:
             raise Exception("execute mapping() first")
 
-        mapping = self.objects[mapping_name]
+        mapped_item = {}
 
-        for key, value in iteritems(mapping):
+        for key, queries in self.compiled[mapping_name]:
 
-            self.mapped_item[key] = None
-            params = value.split(',')
+            mapped_item[key] = None
 
-            for param in params:
+            for query in queries:
+                obj = query(item)
 
-                obj = item
-                obj_param = param
-                obj_key = ""
-                obj_filters = {}
+                if obj is not MISSING:
+                    mapped_item[key] = obj
 
-                if '?' in obj_param:
+                    break
 
-                    if '$' in obj_param:
-                        obj_param, obj_key = obj_param.rsplit('$', 1)
+        if not mapping_name.startswith('Browse') and not mapping_name.startswith('Artwork') and not mapping_name.startswith('UpNext'):
 
-                    obj_param, filters = obj_param.rsplit('?', 1)
+            mapped_item['ProviderName'] = self.objects.get('%sProviderName' % mapping_name)
+            mapped_item['Checksum'] = json.dumps(item['UserData'])
 
-                    if filters:
-                        for filter in filters.split('&'):
-                            filter_key, filter_value = filter.split('=')
-                            obj_filters[filter_key] = filter_value
+        return mapped_item
 
-                if ':' in obj_param:
-                    result = []
 
-                    for d in self.__recursiveloop__(obj, obj_param):
+def compile_query(query):
 
-                        if not obj_filters or self.__filters__(d, obj_filters):
-                            result.append(d)
+    ''' Turn a single element of a mapping into a function of the item. The function
+        returns MISSING when the next fallback should be tried.
+    '''
+    obj_key = ""
+    obj_filters = {}
 
-                    obj = result
-                    obj_filters = {}
+    if '?' in query:
 
-                elif '/' in obj_param:
-                    obj = self.__recursive__(obj, obj_param)
+        if '$' in query:
+            query, obj_key = query.rsplit('$', 1)
 
-                elif obj is item and obj is not None:
-                    obj = item.get(obj_param)
+        query, filters = query.rsplit('?', 1)
 
-                if obj_filters and obj and not self.__filters__(obj, obj_filters):
-                    obj = None
+        if filters:
+            for filter in filters.split('&'):
+                filter_key, filter_value = filter.split('=')
+                obj_filters[filter_key] = filter_value
 
-                if obj is None and len(params) != params.index(param):
-                    continue
+    filters = []
 
-                if obj_key:
-                    obj = [d[obj_key] for d in obj if d.get(obj_key)] if type(obj) == list else obj.get(obj_key)
+    for filter_key, filter_value in iteritems(obj_filters):
 
-                self.mapped_item[key] = obj
-                break
+        inverse = filter_value.startswith('!')
 
-        if not mapping_name.startswith('Browse') and not mapping_name.startswith('Artwork') and not mapping_name.startswith('UpNext'):
+        if inverse:
+            filter_value = filter_value.split('!', 1)[1]
 
-            self.mapped_item['ProviderName'] = self.objects.get('%sProviderName' % mapping_name)
-            self.mapped_item['Checksum'] = json.dumps(item['UserData'])
+        if filter_value.lower() == "null":
+            filter_value = None
 
-        return self.mapped_item
+        filters.append((filter_key, filter_value, inverse))
 
-    def __recursiveloop__(self, obj, keys):
+    if ':' in query:
+        first, rest = query.split(':', 1)
+        path = compile_path(first)
+        list_filters = filters
 
-        first, rest = keys.split(':', 1)
-        obj = self.__recursive__(obj, first)
+        def get(item):
 
-        if obj:
             if rest:
-                for item in obj:
-                    self.__recursiveloop__(item, rest)
-            else:
-                for item in obj:
-                    yield item
+                return []  # Nested lists are not supported
+
+            obj = get_path(item, path)
+
+            return [d for d in obj if not list_filters or match(d, list_filters)] if obj else []
+
+        filters = []
+
+    elif '/' in query:
+        path = compile_path(query)
+
+        def get(item):
+            return get_path(item, path)
 
-    def __recursive__(self, obj, keys):
+    else:
+        def get(item):
+            return item.get(query) if item is not None else None
 
-        for string in keys.split('/'):
+    if not filters and not obj_key:
 
-            if not obj:
-                return
+        def run(item):
+            obj = get(item)
 
-            obj = obj[int(string)] if string.isdigit() else obj.get(string)
+            return MISSING if obj is None else obj
+
+        return run
+
+    def run(item):
+        obj = get(item)
+
+        if filters and obj and not match(obj, filters):
+            obj = None
+
+        if obj is None:
+            return MISSING
+
+        if obj_key:
+            obj = [d[obj_key] for d in obj if d.get(obj_key)] if isinstance(obj, list) else obj.get(obj_key)
 
         return obj
 
-    def __filters__(self, obj, filters):
+    return run
+
+
+def compile_path(keys):
+    return tuple(int(string) if string.isdigit() else string for string in keys.split('/'))
+
+
+def get_path(obj, path):
+
+    for key in path:
 
-        result = False
+        if not obj:
+            return
 
-        for key, value in iteritems(filters):
+        obj = obj[key] if isinstance(key, int) else obj.get(key)
 
-            inverse = False
+    return obj
 
-            if value.startswith('!'):
 
-                inverse = True
-                value = value.split('!', 1)[1]
+def match(obj, filters):
 
-            if value.lower() == "null":
-                value = None
+    ''' The last filter decides the result.
+    '''
+    result = False
 
-            result = obj.get(key) != value if inverse else obj.get(key) == value
+    for key, value, inverse in filters:
+        result = obj.get(key) != value if inverse else obj.get(key) == value
 
-        return result
+    return result
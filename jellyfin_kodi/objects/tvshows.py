@@ -11,7 +11,7 @@ from kodi_six.utils import py2_encode
 
 import downloader as server
 from database import jellyfin_db, queries as QUEM
-from helper import api, stop, validate, jellyfin_item, values, Local
+from helper import api, stop, validate, jellyfin_item, values, fingerprint, KodiDate
 from helper import LazyLogger
 from helper.exceptions import PathValidationException
 
@@ -27,9 +27,10 @@ LOG = LazyLogger(__name__)
 
 class TVShows(KodiDb):
 
-    def __init__(self, server, jellyfindb, videodb, direct_path, library=None, update_library=False):
+    def __init__(self, server, jellyfindb, videodb, direct_path, library=None, update_library=False, context=None):
 
         self.server = server
+        self.context = context or api.SyncContext.create(server)
         self.jellyfin = jellyfindb
         self.video = videodb
         self.direct_path = direct_path
@@ -44,7 +45,7 @@ class TVShows(KodiDb):
 
     @stop
     @jellyfin_item
-    def tvshow(self, item, e_item):
+    def tvshow(self, item, e_item, seasons=None):
 
         ''' If item does not exist, entry will be added.
             If item exists, entry will be updated.
@@ -52,9 +53,11 @@ class TVShows(KodiDb):
             If the show is empty, try to remove it.
             Process seasons.
             Apply series pooling.
+
+            seasons: optional list of season items already fetched by the caller,
+            to avoid requesting them from the server for every show.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'Series')
         update = True
 
@@ -90,7 +93,7 @@ class TVShows(KodiDb):
         self.get_path_filename(obj)
 
         if obj['Premiere']:
-            obj['Premiere'] = str(Local(obj['Premiere'])).split('.')[0].replace('T', " ")
+            obj['Premiere'] = KodiDate(obj['Premiere'])
 
         tags = []
         tags.extend(obj['Tags'] or [])
@@ -117,7 +120,10 @@ class TVShows(KodiDb):
 
         season_episodes = {}
 
-        for season in self.server.jellyfin.get_seasons(obj['Id'])['Items']:
+        if seasons is None:
+            seasons = self.server.jellyfin.get_seasons(obj['Id'])['Items']
+
+        for season in seasons:
 
             if season['SeriesId'] != obj['Id']:
                 obj['SeriesId'] = season['SeriesId']
@@ -209,8 +215,7 @@ class TVShows(KodiDb):
 
             If the show is empty, try to remove it.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'Season')
 
         obj['ShowId'] = show_id
@@ -245,9 +250,9 @@ class TVShows(KodiDb):
             Create additional entry for widgets.
             This is only required for plugin/episode.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'Episode')
+        obj['Fingerprint'] = fingerprint(item, obj, self.library, self.direct_path, self.context)
         update = True
 
         if obj['Location'] == "Virtual":
@@ -274,6 +279,12 @@ class TVShows(KodiDb):
                 update = False
                 LOG.info("EpisodeId %s missing from kodi. repairing the entry.", obj['EpisodeId'])
 
+        if update and e_item[8] == obj['Fingerprint']:
+            LOG.debug("SKIP episode [%s] %s: %s unchanged", obj['EpisodeId'], obj['Id'], obj['Title'])
+            self.item_ids.append(obj['Id'])
+
+            return False
+
         obj['Path'] = API.get_file_path(obj['Path'])
         obj['Index'] = obj['Index'] or -1
         obj['Writers'] = " / ".join(obj['Writers'] or [])
@@ -282,8 +293,8 @@ class TVShows(KodiDb):
         obj['Resume'] = API.adjust_resume((obj['Resume'] or 0) / 10000000.0)
         obj['Runtime'] = round(float((obj['Runtime'] or 0) / 10000000.0), 6)
         obj['People'] = API.get_people_artwork(obj['People'] or [])
-        obj['DateAdded'] = Local(obj['DateAdded']).split('.')[0].replace('T', " ")
-        obj['DatePlayed'] = None if not obj['DatePlayed'] else Local(obj['DatePlayed']).split('.')[0].replace('T', " ")
+        obj['DateAdded'] = KodiDate(obj['DateAdded'])
+        obj['DatePlayed'] = None if not obj['DatePlayed'] else KodiDate(obj['DatePlayed'])
         obj['PlayCount'] = API.get_playcount(obj['Played'], obj['PlayCount'])
         obj['Artwork'] = API.get_all_artwork(self.objects.map(item, 'Artwork'))
         obj['Video'] = API.video_streams(obj['Video'] or [], obj['Container'])
@@ -293,7 +304,7 @@ class TVShows(KodiDb):
         self.get_episode_path_filename(obj)
 
         if obj['Premiere']:
-            obj['Premiere'] = Local(obj['Premiere']).split('.')[0].replace('T', " ")
+            obj['Premiere'] = KodiDate(obj['Premiere'])
 
         if obj['Season'] is None:
             if obj['AbsoluteNumber']:
@@ -328,6 +339,7 @@ class TVShows(KodiDb):
         self.add_playstate(*values(obj, QU.add_bookmark_obj))
         self.artwork.update(obj['Artwork']['Primary'], obj['EpisodeId'], "episode", "thumb")
         self.item_ids.append(obj['Id'])
+        self.jellyfin_db.update_fingerprint(*values(obj, QUEM.update_fingerprint_obj))
 
         if not self.direct_path and obj['Resume']:
 
@@ -435,8 +447,7 @@ class TVShows(KodiDb):
             Make sure there's no other bookmarks created by widget.
             Create additional entry for widgets. This is only required for plugin/episode.
         '''
-        server_address = self.server.auth.get_server_info(self.server.auth.server_id)['address']
-        API = api.API(item, server_address)
+        API = api.API(item, context=self.context)
         obj = self.objects.map(item, 'EpisodeUserData')
 
         try:
@@ -460,10 +471,10 @@ class TVShows(KodiDb):
             obj['PlayCount'] = API.get_playcount(obj['Played'], obj['PlayCount'])
 
             if obj['DatePlayed']:
-                obj['DatePlayed'] = Local(obj['DatePlayed']).split('.')[0].replace('T', " ")
+                obj['DatePlayed'] = KodiDate(obj['DatePlayed'])
 
             if obj['DateAdded']:
-                obj['DateAdded'] = Local(obj['DateAdded']).split('.')[0].replace('T', " ")
+                obj['DateAdded'] = KodiDate(obj['DateAdded'])
 
             self.add_playstate(*values(obj, QU.add_bookmark_obj))
 
@@ -571,6 +582,28 @@ class TVShows(KodiDb):
 
         self.jellyfin_db.remove_item(*values(obj, QUEM.delete_item_obj))
 
+    def remove_items(self, item_ids):
+
+        ''' Remove many tv shows at once with their seasons and episodes, including the
+            episodes pooled from other libraries. One statement per table.
+        '''
+        shows = [x for x in self.jellyfin_db.get_items_by_ids(item_ids) if x[5] == 'tvshow']
+        seasons = self.jellyfin_db.get_items_by_parent_ids([x[1] for x in shows], "season")
+        episodes = dict((x[0], x) for x in self.jellyfin_db.get_items_by_parent_ids([x[1] for x in seasons], "episode"))
+        episodes.update((x[0], x) for x in self.jellyfin_db.get_items_by_jellyfin_parent_ids([x[0] for x in shows]) if x[5] == 'episode')
+        episodes = list(episodes.values())
+
+        self.artwork.delete_many([(x[1], "episode") for x in episodes])
+        self.artwork.delete_many([(x[1], "season") for x in seasons])
+        self.artwork.delete_many([(x[1], "tvshow") for x in shows])
+        self.delete_episodes([(x[1], x[2]) for x in episodes])
+        self.delete_seasons([x[1] for x in seasons])
+        self.delete_tvshows([x[1] for x in shows])
+        self.jellyfin_db.remove_items([x[0] for x in shows + seasons + episodes])
+        LOG.debug("DELETE tvshows: %s seasons: %s episodes: %s", len(shows), len(seasons), len(episodes))
+
+        return {'tvshow': len(shows), 'season': len(seasons), 'episode': len(episodes)}
+
     def remove_tvshow(self, kodi_id, item_id):
 
         self.artwork.delete(kodi_id, "tvshow")
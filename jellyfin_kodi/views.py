@@ -10,7 +10,7 @@ import xml.etree.ElementTree as etree
 from six.moves.urllib.parse import urlencode
 from kodi_six import xbmc, xbmcvfs
 
-from database import Database, jellyfin_db, get_sync, save_sync
+from database import Database, jellyfin_db, get_sync, update_sync
 from helper import translate, api, window, event
 from jellyfin import Jellyfin
 from helper import LazyLogger
@@ -208,7 +208,7 @@ class Views(object):
             if removed:
                 event('RemoveLibrary', {'Id': ','.join(removed)})
 
-        save_sync(self.sync)
+        update_sync(SortedViews=self.sync['SortedViews'])
 
     def get_nodes(self):
 
@@ -18,9 +18,10 @@ sys.path.insert(0, __base__)
 
 #################################################################################################
 
-from entrypoint import Service  # noqa: F402
-from helper.utils import settings  # noqa: F402
-from helper import LazyLogger  # noqa: F402
+from entrypoint import Service  # noqa: E402
+from helper.utils import settings  # noqa: E402
+from helper import LazyLogger  # noqa: E402
+from entrypoint import flush_on_exit  # noqa: E402
 
 #################################################################################################
 
@@ -65,28 +66,29 @@ class ServiceManager(threading.Thread):
 
 
 if __name__ == "__main__":
-    LOG.info("-->[ service ]")
-    LOG.info("Delay startup by %s seconds.", DELAY)
+    with flush_on_exit():
+        LOG.info("-->[ service ]")
+        LOG.info("Delay startup by %s seconds.", DELAY)
 
-    while True:
-        if not settings('enableAddon.bool'):
-            LOG.warning("Jellyfin for Kodi is not enabled.")
+        while True:
+            if not settings('enableAddon.bool'):
+                LOG.warning("Jellyfin for Kodi is not enabled.")
 
-            break
+                break
 
-        try:
-            session = ServiceManager()
-            session.start()
-            session.join()  # Block until the thread exits.
+            try:
+                session = ServiceManager()
+                session.start()
+                session.join()  # Block until the thread exits.
 
-            if 'RestartService' in str(session.exception):
-                continue
+                if 'RestartService' in str(session.exception):
+                    continue
 
-        except Exception as error:
-            ''' Issue initializing the service.
-            '''
-            LOG.exception(error)
+            except Exception as error:
+                ''' Issue initializing the service.
+                '''
+                LOG.exception(error)
 
-        break
+            break
 
-    LOG.info("--<[ service ]")
+        LOG.info("--<[ service ]")
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+''' Time Objects.map against the interpreted mapper it replaced.
+
+    Runs outside of Kodi: python tools/benchmark_mapping.py [iterations]
+'''
+
+#################################################################################################
+
+import json
+import logging
+import os
+import sys
+import timeit
+import types
+
+from six import iteritems
+
+#################################################################################################
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jellyfin_kodi')
+sys.path.insert(0, ROOT)
+
+# objects.obj only needs these two from helper, which otherwise requires Kodi
+helper = types.ModuleType(str('helper'))
+helper.LazyLogger = logging.getLogger
+helper.get_filesystem_encoding = lambda: 'utf-8'
+sys.modules['helper'] = helper
+
+objects = types.ModuleType(str('objects'))
+objects.__path__ = [os.path.join(ROOT, 'objects')]
+sys.modules['objects'] = objects
+
+from objects.obj import Objects  # noqa: E402
+
+#################################################################################################
+
+MOVIE = {
+    'Id': "1", 'Name': "Movie", 'SortName': "Movie", 'OriginalTitle': "Movie", 'Path': "/movies/movie.mkv",
+    'Overview': "Overview", 'ShortOverview': None, 'Taglines': ["Tagline"], 'Genres': ["Action", "Drama"],
+    'ProviderIds': {'Imdb': "tt0000001", 'Tmdb': "1"}, 'CommunityRating': 7.5, 'CriticRating': 80,
+    'ProductionYear': 2000, 'PremiereDate': "2000-01-01T00:00:00.0000000Z", 'DateCreated': "2020-01-01T00:00:00.0000000Z",
+    'OfficialRating': "PG-13", 'ProductionLocations': ["US"], 'Studios': [{'Name': "Studio"}], 'Tags': [],
+    'RunTimeTicks': 72000000000, 'RemoteTrailers': [{'Url': "https://www.youtube.com/watch?v=x"}],
+    'People': [
+        {'Name': "Actor", 'Type': "Actor", 'Role': "Role", 'Id': "2"},
+        {'Name': "Director", 'Type': "Director", 'Id': "3"},
+        {'Name': "Writer", 'Type': "Writer", 'Id': "4"}
+    ],
+    'UserData': {'Played': True, 'PlayCount': 1, 'IsFavorite': False, 'PlaybackPositionTicks': 0},
+    'MediaSources': [{
+        'Path': "/movies/movie.mkv", 'Container': "mkv", 'Name': "Movie",
+        'MediaStreams': [
+            {'Type': "Video", 'Codec': "h264", 'Height': 1080, 'Width': 1920},
+            {'Type': "Audio", 'Codec': "aac", 'Language': "eng", 'Channels': 2},
+            {'Type': "Subtitle", 'Codec': "srt", 'Language': "fre"}
+        ]
+    }],
+    'ParentId': "5", 'ImageTags': {'Primary': "a", 'Logo': "b"}, 'BackdropImageTags': ["c"]
+}
+
+#################################################################################################
+
+
+def interpret(mappings, item, mapping_name):
+
+    ''' The mapper before the queries were compiled, parsing every query for every item.
+    '''
+    def recursive(obj, keys):
+
+        for string in keys.split('/'):
+
+            if not obj:
+                return
+
+            obj = obj[int(string)] if string.isdigit() else obj.get(string)
+
+        return obj
+
+    def filters_match(obj, filters):
+
+        result = False
+
+        for key, value in iteritems(filters):
+
+            inverse = False
+
+            if value.startswith('!'):
+
+                inverse = True
+                value = value.split('!', 1)[1]
+
+            if value.lower() == "null":
+                value = None
+
+            result = obj.get(key) != value if inverse else obj.get(key) == value
+
+        return result
+
+    mapped_item = {}
+
+    for key, value in iteritems(mappings[mapping_name]):
+
+        mapped_item[key] = None
+        params = value.split(',')
+
+        for param in params:
+
+            obj = item
+            obj_param = param
+            obj_key = ""
+            obj_filters = {}
+
+            if '?' in obj_param:
+
+                if '$' in obj_param:
+                    obj_param, obj_key = obj_param.rsplit('$', 1)
+
+                obj_param, filters = obj_param.rsplit('?', 1)
+
+                if filters:
+                    for filter in filters.split('&'):
+                        filter_key, filter_value = filter.split('=')
+                        obj_filters[filter_key] = filter_value
+
+            if ':' in obj_param:
+                first, rest = obj_param.split(':', 1)
+                obj = [d for d in (recursive(obj, first) or []) if not rest and (not obj_filters or filters_match(d, obj_filters))]
+                obj_filters = {}
+
+            elif '/' in obj_param:
+                obj = recursive(obj, obj_param)
+
+            elif obj is item and obj is not None:
+                obj = item.get(obj_param)
+
+            if obj_filters and obj and not filters_match(obj, obj_filters):
+                obj = None
+
+            if obj is None:
+                continue
+
+            if obj_key:
+                obj = [d[obj_key] for d in obj if d.get(obj_key)] if isinstance(obj, list) else obj.get(obj_key)
+
+            mapped_item[key] = obj
+            break
+
+    if not mapping_name.startswith('Browse') and not mapping_name.startswith('Artwork') and not mapping_name.startswith('UpNext'):
+
+        mapped_item['ProviderName'] = mappings.get('%sProviderName' % mapping_name)
+        mapped_item['Checksum'] = json.dumps(item['UserData'])
+
+    return mapped_item
+
+
+def main(iterations=20000):
+
+    objects = Objects()
+    objects.mapping()
+
+    for name in ('Movie', 'Artwork'):
+        if interpret(objects.objects, MOVIE, name) != objects.map(MOVIE, name):
+            raise Exception("%s: the compiled mapping differs from the interpreted one" % name)
+
+    def interpreted():
+        interpret(objects.objects, MOVIE, 'Movie')
+        interpret(objects.objects, MOVIE, 'Artwork')
+
+    def compiled():
+        objects.map(MOVIE, 'Movie')
+        objects.map(MOVIE, 'Artwork')
+
+    results = {}
+
+    for label, function in (('interpreted', interpreted), ('compiled', compiled)):
+
+        results[label] = min(timeit.repeat(function, number=iterations, repeat=3)) / iterations * 1e6
+        print("%-12s %6.1f us per movie" % (label, results[label]))
+
+    print("speedup      %6.2fx" % (results['interpreted'] / results['compiled']))
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:2]])
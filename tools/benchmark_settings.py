@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, absolute_import, print_function, unicode_literals
+
+''' Time settings() against reading the setting from a new Addon object, which is
+    what settings() did before the values were cached. It needs Kodi, the results
+    are written to the Kodi log:
+
+    kodi-send --action="RunScript(special://home/addons/plugin.video.jellyfin/tools/benchmark_settings.py)"
+'''
+
+#################################################################################################
+
+import os
+import sys
+import timeit
+
+from kodi_six import xbmc, xbmcaddon
+
+#################################################################################################
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jellyfin_kodi')
+sys.path.insert(0, ROOT)
+
+from helper.utils import addon_id, settings  # noqa: E402
+
+ITERATIONS = 10000
+
+#################################################################################################
+
+
+def uncached():
+    xbmcaddon.Addon(addon_id()).getSetting('logLevel')
+
+
+def cached():
+    settings('logLevel')
+
+
+def main():
+
+    results = {}
+
+    for label, function in (('uncached', uncached), ('cached', cached)):
+
+        results[label] = min(timeit.repeat(function, number=ITERATIONS, repeat=3)) / ITERATIONS * 1e6
+        xbmc.log("[ benchmark_settings ] %-8s %8.2f us per read" % (label, results[label]), level=xbmc.LOGNOTICE)
+
+    xbmc.log("[ benchmark_settings ] speedup  %8.2fx" % (results['uncached'] / results['cached']), level=xbmc.LOGNOTICE)
+
+
+if __name__ == "__main__":
+    main()